@@ -0,0 +1,77 @@
+"""HTML parsing micro-benchmark for the scrapers
+
+Parses the saved pages in fixtures/deviantart with every available
+BeautifulSoup backend, with and without restricting the tree to the tags
+the scrapers query, and runs the DeviantArt link / image extraction on
+each result. Reports pages/sec per backend and checks that every backend
+extracts the same URLs as the original full html.parser tree.
+
+    python Benchmarks/html_parse_benchmark.py --iterations 50
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+FIXTURE_DIR = ROOT / 'fixtures' / 'deviantart'
+sys.path.insert(0, str(ROOT.parent / 'Modules'))
+
+from html_parsing import make_soup, LINK_TAGS, LINK_AND_IMAGE_TAGS  # noqa: E402
+from Deviantart_scraper import find_artwork_links, find_image_urls  # noqa: E402
+
+# Fixture page -> (tags the scraper keeps, extraction run on the tree)
+PAGES = {
+    'search.html': (LINK_TAGS, find_artwork_links),
+    'artwork.html': (LINK_AND_IMAGE_TAGS, find_image_urls),
+}
+BASELINE = ('html.parser', False)
+
+
+def available_parsers():
+    parsers = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        parsers.append('lxml')
+    except ImportError:
+        print("ℹ️  lxml is not installed, only html.parser is measured")
+    return parsers
+
+
+def run_backend(html, tags, extract, parser, strained, iterations):
+    """Parse and extract `iterations` times, returns (pages/sec, extracted URLs)"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = extract(make_soup(html, tags if strained else None, parser))
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML parsing backends on saved DeviantArt pages")
+    parser.add_argument('--iterations', type=int, default=20, help="parses per backend and page")
+    args = parser.parse_args()
+
+    backends = [(name, strained) for name in available_parsers() for strained in (False, True)]
+    ok = True
+    for page, (tags, extract) in PAGES.items():
+        html = (FIXTURE_DIR / page).read_text(encoding='utf-8')
+        print(f"\n📄 {page} ({len(html) / 1024:.0f} KB, keeping <{'>, <'.join(tags)}> when restricted)")
+
+        results = {}
+        for name, strained in backends:
+            rate, urls = run_backend(html, tags, extract, name, strained, args.iterations)
+            results[(name, strained)] = (rate, urls)
+
+        base_rate, base_urls = results[BASELINE]
+        for (name, strained), (rate, urls) in results.items():
+            label = f"{name}{' + strainer' if strained else ''}"
+            match = "✅" if urls == base_urls else "❌ different URLs"
+            ok = ok and urls == base_urls
+            print(f"  {label:<24} {rate:8.1f} pages/sec  x{rate / base_rate:5.2f}  {len(urls)} URLs {match}")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
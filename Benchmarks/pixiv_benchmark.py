@@ -0,0 +1,390 @@
+"""Offline throughput benchmark for the Pixiv downloader
+
+Starts a local HTTP server that replays the JSON fixtures in
+fixtures/pixiv for the search, illust and pages endpoints (and the user
+profile and bookmark listings built from them) and serves synthetic
+images, then drives SimplifiedPixivDownloader.bulk_download_by_tag
+(or the user / bookmark sources) against it. Requests for www.pixiv.net and i.pximg.net are redirected to
+the server by a transport adapter, so the downloader code runs unchanged.
+
+Reports images/sec, CPU time (this process and the encoder processes)
+and peak RSS, plus the downloader's own per-stage timings.
+
+    python Benchmarks/pixiv_benchmark.py --artworks 200 --latency-ms 40 --throttle 0.02
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import struct
+import zlib
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent
+FIXTURE_DIR = ROOT / 'fixtures' / 'pixiv'
+sys.path.insert(0, str(ROOT.parent / 'Modules'))
+
+from PixivScraper import SimplifiedPixivDownloader, STORAGE_ORIGINAL, STORAGE_PNG  # noqa: E402
+
+# Values in the recorded fixtures that are swapped for the synthetic artwork's
+FIXTURE_ID = '100000000'
+FIXTURE_EXTENSION = '_p0.png'
+FIRST_ARTWORK_ID = 110000000
+BENCHMARK_USER_ID = '1000'
+IMAGE_FORMATS = {'png': ('PNG', '.png'), 'jpg': ('JPEG', '.jpg')}
+
+
+def load_fixture(name):
+    with open(FIXTURE_DIR / name, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def make_image(width, height, image_format):
+    """Render a noisy gradient so encoders see realistic, not trivially compressible, data"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 48)
+    image = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    pil_format = IMAGE_FORMATS[image_format][0]
+    image.save(buffer, pil_format, **({'quality': 92} if pil_format == 'JPEG' else {'compress_level': 6}))
+    return buffer.getvalue()
+
+
+def tag_image(data, image_format, key):
+    """Return a copy of the image with key embedded as metadata
+    
+    Every artwork page gets distinct bytes, otherwise the downloader's
+    source-hash dedupe would treat the whole catalogue as one image.
+    """
+    key = key.encode('ascii')
+    if image_format == 'jpg':
+        # COM segment right after SOI
+        return data[:2] + b'\xff\xfe' + struct.pack('>H', len(key) + 2) + key + data[2:]
+    # tEXt chunk right after the 8-byte signature and 25-byte IHDR chunk
+    chunk = b'tEXt' + b'Comment\x00' + key
+    text = struct.pack('>I', len(chunk) - 4) + chunk + struct.pack('>I', zlib.crc32(chunk))
+    return data[:33] + text + data[33:]
+
+
+class MockPixivServer(ThreadingHTTPServer):
+    """Serves a fixed catalogue of synthetic artworks in pixiv's API shapes"""
+    daemon_threads = True
+
+    def __init__(self, address, artworks, per_page, manga_ratio, manga_pages, image_data,
+                 image_format, latency, jitter, throttle, seed):
+        super().__init__(address, MockPixivHandler)
+        self.per_page = per_page
+        self.image_data = image_data
+        self.image_format = image_format
+        self.extension = IMAGE_FORMATS[image_format][1]
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+        # artwork id -> page count, with a fixed share of multi-page works
+        self.artworks = {}
+        for index in range(artworks):
+            manga = self.rng.random() < manga_ratio
+            self.artworks[str(FIRST_ARTWORK_ID + index)] = manga_pages if manga else 1
+        self.ids = list(self.artworks)
+
+        self.search_template = json.loads(load_fixture('search.json'))
+        self.item_template = load_fixture('search_item.json')
+        self.illust_template = load_fixture('illust.json')
+        self.page_template = json.dumps(json.loads(load_fixture('pages.json'))['body'][0])
+
+        self.counts_lock = threading.Lock()
+        self.counts = {'requests': 0, 'throttled': 0, 'not_found': 0, 'ranged': 0, 'image_bytes': 0}
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections at shutdown are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, key, amount=1):
+        with self.counts_lock:
+            self.counts[key] += amount
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def delay(self):
+        with self.rng_lock:
+            seconds = self.rng.gauss(self.latency, self.jitter) if self.jitter else self.latency
+        return max(0.0, seconds)
+
+    def _for_artwork(self, template, artwork_id):
+        return (template.replace(FIXTURE_ID, artwork_id)
+                .replace(FIXTURE_EXTENSION, '_p0' + self.extension))
+
+    def search_body(self, page):
+        body = json.loads(json.dumps(self.search_template))
+        start = (page - 1) * self.per_page
+        chunk = self.ids[start:start + self.per_page]
+        results = body['body']['illustManga']
+        results['data'] = []
+        for artwork_id in chunk:
+            results['data'].append(self.search_item(artwork_id))
+        results['total'] = len(self.ids)
+        results['lastPage'] = max(1, -(-len(self.ids) // self.per_page))
+        results['isLastPage'] = start + self.per_page >= len(self.ids)
+        return body
+
+    def illust_body(self, artwork_id):
+        body = json.loads(self._for_artwork(self.illust_template, artwork_id))
+        body['body']['pageCount'] = self.artworks[artwork_id]
+        return body
+
+    def search_item(self, artwork_id):
+        item = json.loads(self._for_artwork(self.item_template, artwork_id))
+        item['pageCount'] = self.artworks[artwork_id]
+        return item
+
+    def profile_body(self):
+        """/ajax/user/{id}/profile/all: every work ID, split into illusts and manga"""
+        illusts = {artwork_id: None for artwork_id, pages in self.artworks.items() if pages == 1}
+        manga = {artwork_id: None for artwork_id, pages in self.artworks.items() if pages > 1}
+        return {'error': False, 'message': '', 'body': {'illusts': illusts or [], 'manga': manga or [],
+                                                         'novels': [], 'mangaSeries': [], 'novelSeries': []}}
+
+    def user_works_body(self, artwork_ids):
+        works = {artwork_id: self.search_item(artwork_id) for artwork_id in artwork_ids if artwork_id in self.artworks}
+        return {'error': False, 'message': '', 'body': {'works': works, 'extraData': {}}}
+
+    def bookmarks_body(self, offset, limit):
+        chunk = self.ids[offset:offset + limit]
+        return {'error': False, 'message': '',
+                'body': {'works': [self.search_item(artwork_id) for artwork_id in chunk],
+                         'total': len(self.ids), 'extraData': {}}}
+
+    def pages_body(self, artwork_id):
+        page = self._for_artwork(self.page_template, artwork_id)
+        return {'error': False, 'message': '',
+                'body': [json.loads(page.replace('_p0', f'_p{index}'))
+                         for index in range(self.artworks[artwork_id])]}
+
+
+class MockPixivHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        time.sleep(server.delay())
+
+        if server.throttle and server.random() < server.throttle:
+            server.count('throttled')
+            return self._send(429, b'{"error": true, "message": "rate limited"}', headers={'Retry-After': '1'})
+
+        parts = urlsplit(self.path)
+        segments = [unquote(segment) for segment in parts.path.strip('/').split('/')]
+        if segments[:3] == ['ajax', 'search', 'artworks']:
+            page = int(parse_qs(parts.query).get('p', ['1'])[0])
+            return self._send_json(server.search_body(page))
+        if segments[:2] == ['ajax', 'user'] and len(segments) >= 4:
+            query = parse_qs(parts.query)
+            if segments[3:] == ['profile', 'all']:
+                return self._send_json(server.profile_body())
+            if segments[3:] == ['profile', 'illusts']:
+                return self._send_json(server.user_works_body(query.get('ids[]', [])))
+            if segments[3:] == ['illusts', 'bookmarks']:
+                offset = int(query.get('offset', ['0'])[0])
+                limit = int(query.get('limit', ['48'])[0])
+                return self._send_json(server.bookmarks_body(offset, limit))
+        if segments[:2] == ['ajax', 'illust'] and len(segments) >= 3 and segments[2] in server.artworks:
+            if len(segments) == 4 and segments[3] == 'pages':
+                return self._send_json(server.pages_body(segments[2]))
+            return self._send_json(server.illust_body(segments[2]))
+        if segments[0] == 'img-original' and segments[-1].endswith(server.extension):
+            artwork_id = segments[-1].split('_p', 1)[0]
+            if artwork_id in server.artworks:
+                name = segments[-1][:-len(server.extension)]
+                return self._send_image(tag_image(server.image_data, server.image_format, name))
+
+        server.count('not_found')
+        self._send(404, b'{"error": true, "message": "not found"}')
+
+    def _send_json(self, body):
+        self._send(200, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def _send_image(self, data):
+        start = 0
+        ranged = self.headers.get('Range', '')
+        if ranged.startswith('bytes=') and ranged.endswith('-'):
+            start = min(int(ranged[6:-1]), len(data))
+        payload = data[start:]
+        self.server.count('image_bytes', len(payload))
+        if start:
+            self.server.count('ranged')
+            headers = {'Content-Range': f'bytes {start}-{len(data) - 1}/{len(data)}'}
+            return self._send(206, payload, 'image/' + self.server.extension[1:], headers)
+        self._send(200, payload, 'image/' + self.server.extension[1:])
+
+    def _send(self, status, payload, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class LocalRedirectAdapter(HTTPAdapter):
+    """Send every request to the mock server, keeping path and query"""
+
+    def __init__(self, address, **kwargs):
+        self.base = f'http://{address[0]}:{address[1]}'
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = self.base + parts.path + (f'?{parts.query}' if parts.query else '')
+        return super().send(request, **kwargs)
+
+
+def resource_usage():
+    """Return (cpu_seconds_self, cpu_seconds_children, peak_rss_mb_self, peak_rss_mb_children)"""
+    if resource is None:
+        times = os.times()
+        return times.user + times.system, times.children_user + times.children_system, None, None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    per_mb = 1024 * 1024 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    return (own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime,
+            own.ru_maxrss / per_mb, children.ru_maxrss / per_mb)
+
+
+def run_benchmark(args):
+    image_data = make_image(args.width, args.height, args.format)
+    server = MockPixivServer(('127.0.0.1', 0), args.artworks, args.per_page, args.manga_ratio,
+                             args.manga_pages, image_data, args.format, args.latency_ms / 1000,
+                             args.jitter_ms / 1000, args.throttle, args.seed)
+    server_thread = threading.Thread(target=server.serve_forever, name='mock-pixiv', daemon=True)
+    server_thread.start()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix='pixiv-bench-') as workdir:
+            workdir = Path(workdir)
+            downloader = SimplifiedPixivDownloader(
+                phpsessid='benchmark',
+                download_dir=workdir / 'images',
+                db_path=str(workdir / 'benchmark.db'),
+                workers=args.workers,
+                rate_limits={'www.pixiv.net': args.rate, 'i.pximg.net': args.rate},
+                storage_mode=STORAGE_ORIGINAL if args.keep_original else STORAGE_PNG,
+                encoders=args.encoders,
+                search_cache_ttl=0,
+                metrics_json=workdir / 'metrics.json',
+            )
+            downloader.session.mount('https://', LocalRedirectAdapter(
+                server.server_address, max_retries=0, pool_maxsize=downloader.workers * 2))
+
+            cpu_before, children_before, _, _ = resource_usage()
+            started = time.perf_counter()
+            try:
+                if args.source == 'user':
+                    stats = downloader.bulk_download_by_user(BENCHMARK_USER_ID, max_images=args.max_images)
+                elif args.source == 'bookmarks':
+                    stats = downloader.bulk_download_by_bookmarks(BENCHMARK_USER_ID, max_images=args.max_images)
+                else:
+                    stats = downloader.bulk_download_by_tag(args.tag, max_images=args.max_images, resume=False)
+            finally:
+                downloader.close()  # joins the encoder processes so their CPU time is counted
+            elapsed = time.perf_counter() - started
+            cpu_after, children_after, peak_rss, children_peak_rss = resource_usage()
+            stages = downloader.metrics.summary()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        'config': vars(args),
+        'image_bytes': len(image_data),
+        'elapsed_seconds': round(elapsed, 3),
+        'images': stats['downloaded'],
+        'images_per_sec': round(stats['downloaded'] / elapsed, 3),
+        'mb_per_sec': round(stats['bytes_downloaded'] / elapsed / (1024 * 1024), 3),
+        'cpu_seconds': round(cpu_after - cpu_before, 3),
+        'encoder_cpu_seconds': round(children_after - children_before, 3),
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        'encoder_peak_rss_mb': round(children_peak_rss, 1) if children_peak_rss is not None else None,
+        'downloader_stats': dict(stats),
+        'server': dict(server.counts),
+        'stages': stages,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Pixiv downloader against a local mock server')
+    parser.add_argument('--artworks', type=int, default=120, help='Artworks in the mock catalogue (default: 120)')
+    parser.add_argument('--per-page', type=int, default=60, help='Search results per page (default: 60)')
+    parser.add_argument('--manga-ratio', type=float, default=0.2, help='Share of multi-page works (default: 0.2)')
+    parser.add_argument('--manga-pages', type=int, default=3, help='Pages per multi-page work (default: 3)')
+    parser.add_argument('--width', type=int, default=1200, help='Synthetic image width (default: 1200)')
+    parser.add_argument('--height', type=int, default=1600, help='Synthetic image height (default: 1600)')
+    parser.add_argument('--format', choices=IMAGE_FORMATS, default='jpg', help='Served image format (default: jpg)')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Mean added latency per request (default: 20)')
+    parser.add_argument('--jitter-ms', type=float, default=5.0, help='Latency standard deviation (default: 5)')
+    parser.add_argument('--throttle', type=float, default=0.0, help='Share of requests answered with 429 (default: 0)')
+    parser.add_argument('--rate', type=float, default=500.0,
+                        help='Starting requests/sec per host given to the downloader (default: 500)')
+    parser.add_argument('--workers', type=int, default=4, help='Downloader workers (default: 4)')
+    parser.add_argument('--encoders', type=int, help='PNG encoder processes (default: all cores, 0 = inline)')
+    parser.add_argument('--keep-original', action='store_true', help='Benchmark keep-original storage')
+    parser.add_argument('--max-images', type=int, help='Stop after this many images')
+    parser.add_argument('--source', choices=('tag', 'user', 'bookmarks'), default='tag',
+                        help='List the catalogue through tag search, a user profile or bookmarks (default: tag)')
+    parser.add_argument('--tag', default='benchmark', help='Tag searched for (default: benchmark)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for catalogue, latency and throttling (default: 1)')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+
+    print("\n" + "=" * 60)
+    print("🏁 PIXIV BENCHMARK")
+    print("=" * 60)
+    print(f"   🖼️  Images: {report['images']} in {report['elapsed_seconds']:.2f}s "
+          f"({report['images_per_sec']:.2f} img/s, {report['mb_per_sec']:.2f} MB/s)")
+    print(f"   🧮 CPU: {report['cpu_seconds']:.2f}s downloader, {report['encoder_cpu_seconds']:.2f}s encoders")
+    if report['peak_rss_mb'] is not None:
+        print(f"   📈 Peak RSS: {report['peak_rss_mb']:.1f} MB downloader, "
+              f"{report['encoder_peak_rss_mb']:.1f} MB largest encoder")
+    server = report['server']
+    print(f"   🌐 Server: {server['requests']} requests, {server['throttled']} throttled, "
+          f"{server['not_found']} not found, {server['ranged']} ranged")
+    print("=" * 60)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.json_path}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
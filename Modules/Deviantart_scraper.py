@@ -1,9 +1,15 @@
 import requests
-from bs4 import BeautifulSoup
+import json
+import sqlite3
+import hashlib
+from collections import Counter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from html_parsing import make_soup, LINK_TAGS, LINK_AND_IMAGE_TAGS
 import os
 import time
 import re
-import random
+import queue
 from urllib.parse import quote_plus, urlparse
 import threading
 from tqdm import tqdm
@@ -12,6 +18,81 @@ import mimetypes
 from PIL import Image
 import io
 
+# Requests per second per host; search and artwork pages come from
+# www.deviantart.com, images from the wixmp CDN
+HOST_RATE_LIMITS = {
+    'www.deviantart.com': 2.0,
+}
+DEFAULT_RATE_LIMIT = 6.0
+
+# Connection reuse and retries for the shared session
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 3
+REQUEST_TIMEOUT = 30
+
+# Artwork links waiting for a worker, per worker
+QUEUE_PER_WORKER = 4
+
+# Images smaller than this (either side) are treated as icons and skipped
+MIN_IMAGE_SIZE = 500
+
+# Dimensions are read from the first bytes of the stream; JPEG EXIF/ICC
+# segments can push the SOF marker back, so keep reading up to the limit
+PROBE_CHUNK_SIZE = 4096
+PROBE_MAX_BYTES = 64 * 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# SOF markers carrying the frame size (C4, C8 and CC are DHT/JPG/DAC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Crawl index kept next to the topic folders, so restarted or repeated runs
+# of a topic skip artworks and images they already handled
+INDEX_FILE_NAME = 'deviantart_index.db'
+INDEX_HASH_ALGORITHM = 'sha1'
+INDEX_BATCH_SIZE = 50
+
+# Artwork outcomes stored in the index; failed requests are not stored so they are retried
+ARTWORK_DOWNLOADED = 'downloaded'
+ARTWORK_SKIPPED = 'skipped'
+
+CREATE_INDEX_SQL = """
+    CREATE TABLE IF NOT EXISTS artworks (
+        topic TEXT NOT NULL,
+        artwork_url TEXT NOT NULL,
+        status TEXT NOT NULL,
+        visited INTEGER,
+        PRIMARY KEY (topic, artwork_url)
+    );
+    CREATE TABLE IF NOT EXISTS images (
+        topic TEXT NOT NULL,
+        image_url TEXT NOT NULL,
+        artwork_url TEXT,
+        content_hash TEXT NOT NULL,
+        file_path TEXT,
+        downloaded INTEGER,
+        PRIMARY KEY (topic, image_url)
+    );
+    CREATE INDEX IF NOT EXISTS idx_images_hash ON images (topic, content_hash);
+    CREATE TABLE IF NOT EXISTS search_progress (
+        topic TEXT PRIMARY KEY,
+        resume_page INTEGER NOT NULL,
+        updated INTEGER
+    );
+"""
+SELECT_VISITED_SQL = 'SELECT artwork_url FROM artworks WHERE topic = ?'
+SELECT_IMAGES_SQL = 'SELECT image_url, artwork_url, content_hash, file_path FROM images WHERE topic = ?'
+SELECT_RESUME_PAGE_SQL = 'SELECT resume_page FROM search_progress WHERE topic = ?'
+UPSERT_ARTWORK_SQL = 'INSERT OR REPLACE INTO artworks (topic, artwork_url, status, visited) VALUES (?, ?, ?, ?)'
+UPSERT_IMAGE_SQL = ('INSERT OR REPLACE INTO images (topic, image_url, artwork_url, content_hash, file_path, downloaded) '
+                    'VALUES (?, ?, ?, ?, ?, ?)')
+UPSERT_SEARCH_PROGRESS_SQL = 'INSERT OR REPLACE INTO search_progress (topic, resume_page, updated) VALUES (?, ?, ?)'
+
+# Search pages embed their results as window.__INITIAL_STATE__, either as a
+# JSON.parse("...") string literal or as a plain object literal
+INITIAL_STATE_PATTERN = re.compile(
+    r'window\.__INITIAL_STATE__\s*=\s*(?:JSON\.parse\(("(?:[^"\\]|\\.)*")\)|(\{.*?\}))\s*;\s*(?:</script>|window\.)',
+    re.DOTALL)
+
 def clear_screen():
     # For Windows
     if os.name == "nt":
@@ -41,8 +122,244 @@ def display_header():
     print("• By using this tool, you accept full responsibility")
     print("=" * 60)
 
+def _jpeg_size(head):
+    """Walk the JPEG segments up to the first SOF marker"""
+    i = 2
+    while i + 9 <= len(head):
+        if head[i] != 0xFF:
+            return None
+        marker = head[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD8:  # markers without a length
+            i += 2
+        elif marker in JPEG_SOF_MARKERS:
+            height = int.from_bytes(head[i + 5:i + 7], 'big')
+            width = int.from_bytes(head[i + 7:i + 9], 'big')
+            return width, height
+        else:
+            i += 2 + int.from_bytes(head[i + 2:i + 4], 'big')
+    return None
+
+def _webp_size(head):
+    """Read the canvas size from a VP8, VP8L or VP8X chunk"""
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30 and head[23:26] == b'\x9d\x01\x2a':
+        return (int.from_bytes(head[26:28], 'little') & 0x3FFF,
+                int.from_bytes(head[28:30], 'little') & 0x3FFF)
+    if chunk == b'VP8L' and len(head) >= 25 and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(head) >= 30:
+        return (int.from_bytes(head[24:27], 'little') + 1,
+                int.from_bytes(head[27:30], 'little') + 1)
+    return None
+
+def probe_image_size(head):
+    """Get (width, height) from the first bytes of a JPEG, PNG, GIF or WebP file, None if unknown or incomplete"""
+    if head[:8] == PNG_SIGNATURE:
+        if len(head) >= 24 and head[12:16] == b'IHDR':
+            return int.from_bytes(head[16:20], 'big'), int.from_bytes(head[20:24], 'big')
+        return None
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        if len(head) >= 10:
+            return int.from_bytes(head[6:8], 'little'), int.from_bytes(head[8:10], 'little')
+        return None
+    if head[:2] == b'\xff\xd8':
+        return _jpeg_size(head)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _webp_size(head)
+    return None
+
+def parse_initial_state(html):
+    """Extract the initial-state JSON embedded in a DeviantArt page, or None"""
+    match = INITIAL_STATE_PATTERN.search(html)
+    if not match:
+        return None
+    try:
+        if match.group(1):
+            # JS string literal: \' is valid there but not in JSON
+            return json.loads(json.loads(match.group(1).replace("\\'", "'")))
+        return json.loads(match.group(2))
+    except ValueError:
+        return None
+
+def deviation_image(deviation):
+    """Build (url, width, height) of a deviation's full-size image from its media entry"""
+    media = deviation.get('media') or {}
+    base_uri = media.get('baseUri')
+    fullview = next((t for t in media.get('types') or [] if t.get('t') == 'fullview'), None)
+    if not base_uri or not fullview:
+        return None  # literature, journals: the artwork page is used instead
+    
+    url = base_uri
+    if fullview.get('c'):
+        url += '/' + fullview['c'].lstrip('/').replace('<prettyName>', media.get('prettyName', ''))
+    tokens = media.get('token') or []
+    if tokens:
+        url += f"?token={tokens[0]}"
+    return url, fullview.get('w'), fullview.get('h')
+
+def find_image_urls(soup):
+    """Find the full-size image URLs on a parsed artwork page, best candidates first"""
+    image_urls = []
+    
+    # Method 1: Try to find the download button href - best quality option
+    download_buttons = soup.select('a[data-hook="download_button"]')
+    if download_buttons:
+        for button in download_buttons:
+            href = button.get('href')
+            if href:
+                image_urls.append(href)
+                return image_urls  # This is likely the best quality image
+    
+    # Method 2: Find main full-resolution image
+    main_img = soup.select_one('img[data-hook="deviation_std_img"]')
+    if main_img and main_img.get('src'):
+        img_url = main_img.get('src')
+        # Try to get full-resolution version
+        img_url = re.sub(r'/v\d+/.*?/', '/f/', img_url)
+        img_url = img_url.replace('/200H/', '/').replace('/250/', '/')
+        img_url = img_url.replace('/400T/', '/').replace('/300W/', '/')
+        image_urls.append(img_url)
+        return image_urls
+    
+    # Method 3: Look for other image elements that might be full-sized artwork
+    image_elements = []
+    image_elements.extend(soup.select('img.dev-content-full'))
+    image_elements.extend(soup.select('img.dev-content-normal'))
+    image_elements.extend(soup.select('img.fullview'))
+    
+    # If still not found, look for any reasonable sized images
+    if not image_elements:
+        for img in soup.find_all('img'):
+            src = img.get('src', '')
+            # Only consider DeviantArt or wixmp (their CDN) images
+            if (('deviantart' in src or 'wixmp.com' in src) and 
+                not any(pattern in src.lower() for pattern in ['/avatars/', '/icons/', '/emoticons/', '/thumbs/', 'thumbnail', 'icon', 'avatar'])):
+    
+                # Check if it has width attribute and it's big enough
+                width = img.get('width')
+                if width and int(width) >= 500:
+                    image_elements.append(img)
+                # Or add it if it seems like a content image
+                elif re.search(r'/f/|/intermediary/|/pre\d+/', src):
+                    image_elements.append(img)
+    
+    for img in image_elements:
+        img_url = img.get('src') or img.get('data-src')
+        if img_url:
+            # Try to get full-resolution version
+            img_url = img_url.replace('/200H/', '/').replace('/250/', '/')
+            img_url = img_url.replace('/400T/', '/').replace('/300W/', '/')
+            image_urls.append(img_url)
+    
+    return image_urls
+
+def find_artwork_links(soup):
+    """Collect artwork page links (without fragments) from a parsed search page, in page order"""
+    artwork_links = []
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        # DeviantArt artwork URLs usually follow this pattern
+        if re.search(r'deviantart\.com/[^/]+/art/', href):
+            # Remove any fragments and duplicates
+            base_href = href.split('#')[0]
+            if base_href not in artwork_links:
+                artwork_links.append(base_href)
+    return artwork_links
+
+class CrawlIndex:
+    """On-disk record of what a crawl has already done, shared by all topics"""
+    def __init__(self, db_path):
+        # One connection shared by the workers, guarded by the lock; writes are committed in batches
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.pending_writes = 0
+        
+        with self.lock:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.executescript(CREATE_INDEX_SQL)
+            self.db.commit()
+            
+    def load_topic(self, topic):
+        """Return (visited artwork URLs, image URLs, content hashes, highest image number) for a topic"""
+        with self.lock:
+            visited = {row[0] for row in self.db.execute(SELECT_VISITED_SQL, (topic,))}
+            images = self.db.execute(SELECT_IMAGES_SQL, (topic,)).fetchall()
+            
+        image_urls, hashes = set(), set()
+        highest_number = 0
+        for image_url, artwork_url, content_hash, file_path in images:
+            if file_path and os.path.exists(file_path):
+                image_urls.add(image_url)
+                hashes.add(content_hash)
+                # File names start with the image number
+                number = os.path.basename(file_path).split('_', 1)[0]
+                if number.isdigit():
+                    highest_number = max(highest_number, int(number))
+            else:
+                # File was deleted, so the next crawl downloads its artwork again
+                visited.discard(artwork_url)
+        return visited, image_urls, hashes, highest_number
+        
+    def resume_page(self, topic):
+        """Search page the topic's next crawl should start from"""
+        with self.lock:
+            row = self.db.execute(SELECT_RESUME_PAGE_SQL, (topic,)).fetchone()
+        return row[0] if row else 1
+        
+    def _write(self, sql, params):
+        with self.lock:
+            self.db.execute(sql, params)
+            self.pending_writes += 1
+            if self.pending_writes >= INDEX_BATCH_SIZE:
+                self.db.commit()
+                self.pending_writes = 0
+                
+    def record_artwork(self, topic, artwork_url, status):
+        self._write(UPSERT_ARTWORK_SQL, (topic, artwork_url, status, int(time.time())))
+        
+    def record_image(self, topic, image_url, artwork_url, content_hash, file_path):
+        self._write(UPSERT_IMAGE_SQL, (topic, image_url, artwork_url, content_hash, file_path, int(time.time())))
+        
+    def save_resume_page(self, topic, page):
+        self._write(UPSERT_SEARCH_PROGRESS_SQL, (topic, page, int(time.time())))
+        
+    def close(self):
+        """Commit queued writes and close the connection"""
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+class HostRateLimiter:
+    """Thread-safe per-host pacing: requests to a host are spaced evenly at its rate"""
+    def __init__(self, rate_limits=None, default_rate=DEFAULT_RATE_LIMIT):
+        self.rates = dict(HOST_RATE_LIMITS)
+        if rate_limits:
+            self.rates.update(rate_limits)
+        self.default_rate = default_rate
+        self.next_slot = {}
+        self.lock = threading.Lock()
+        
+    def wait(self, url):
+        """Block until a request to the URL's host is allowed"""
+        host = urlparse(url).netloc
+        
+        # Reserve the next free slot for this host, then sleep outside the lock
+        with self.lock:
+            interval = 1.0 / self.rates.get(host, self.default_rate)
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + interval
+            
+        if slot > now:
+            time.sleep(slot - now)
+
 class DeviantArtScraper:
-    def __init__(self, topic, max_images=1000, output_dir="DeviantArt"):
+    def __init__(self, topic, max_images=1000, output_dir="DeviantArt", workers=4, rate_limits=None):
         self.topic = topic
         self.max_images = max_images
         # Create folder structure: DeviantArt/topic_name/
@@ -51,17 +368,119 @@ class DeviantArtScraper:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         }
         self.downloaded_count = 0
+        self.in_flight = 0
+        self.skipped_early = 0
+        self.bytes_saved = 0
+        self.resolved_from_search = 0
+        self.skipped_visited = 0
+        self.skipped_duplicates = 0
         self.processed_urls = set()
-        self.progress_bar = None  # Initialize as None, create when first download succeeds
+        self.pending_pages = Counter()  # search page -> artworks queued but not finished
+        self.progress_bar = None  # Created when search_and_download starts
+        
+        # Search pages are fetched on the calling thread, artworks by a worker pool
+        self.workers = max(1, workers)
+        self.lock = threading.Lock()
+        self.rate_limiter = HostRateLimiter(rate_limits)
+        
+        # One pooled session so connections (and TLS handshakes) are reused
+        self.session = requests.Session()
+        retries = Retry(total=MAX_RETRIES, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                        allowed_methods=('GET',), respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=self.workers * 2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
 
         clear_screen()
         # Create output directory if it doesn't exist
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
             print(f"📁 Created directory: {self.output_dir}")
+            
+        # What earlier runs of this topic already handled
+        self.index = CrawlIndex(os.path.join(output_dir, INDEX_FILE_NAME))
+        self.visited_artworks, self.known_image_urls, self.known_hashes, self.last_number = \
+            self.index.load_topic(topic)
+            
+    def _get(self, url, **kwargs):
+        """GET through the pooled session, paced by the per-host rate limiter"""
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        self.rate_limiter.wait(url)
+        return self.session.get(url, **kwargs)
+        
+    def _write(self, message):
+        """Print above the progress bar when there is one"""
+        if self.progress_bar is not None:
+            self.progress_bar.write(message)
+        else:
+            print(message)
+            
+    def _reserve_slot(self):
+        """Reserve an image number, or return None once max_images is covered"""
+        with self.lock:
+            if self.downloaded_count + self.in_flight >= self.max_images:
+                return None
+            self.in_flight += 1
+            # Only ever counts up, so a failed save never frees its number for reuse;
+            # numbers continue after the images earlier runs saved for this topic
+            self.last_number += 1
+            return self.last_number
+            
+    def _release_slot(self, success):
+        """Release a reserved slot, counting it as downloaded on success"""
+        with self.lock:
+            self.in_flight -= 1
+            if success:
+                self.downloaded_count += 1
+        if success and self.progress_bar is not None:
+            self.progress_bar.update(1)
+            
+    def _record_early_skip(self, response, bytes_read):
+        """Count an image rejected from its header and the bytes not transferred"""
+        content_length = response.headers.get('Content-Length', '')
+        saved = int(content_length) - bytes_read if content_length.isdigit() else 0
+        with self.lock:
+            self.skipped_early += 1
+            self.bytes_saved += max(0, saved)
+            
+    def _reached_max(self):
+        with self.lock:
+            return self.downloaded_count >= self.max_images
+            
+    def _claim_hash(self, content_hash):
+        """Claim image content for this worker, returns False if it is already on disk or in progress"""
+        with self.lock:
+            if content_hash in self.known_hashes:
+                self.skipped_duplicates += 1
+                return False
+            self.known_hashes.add(content_hash)
+            return True
+            
+    def _release_hash(self, content_hash):
+        with self.lock:
+            self.known_hashes.discard(content_hash)
+            
+    def _record_image(self, image_key, artwork_url, content_hash, file_path):
+        with self.lock:
+            self.known_image_urls.add(image_key)
+        self.index.record_image(self.topic, image_key, artwork_url, content_hash, file_path)
+        
+    def _record_artwork(self, artwork_url, downloaded):
+        with self.lock:
+            self.visited_artworks.add(artwork_url)
+        self.index.record_artwork(self.topic, artwork_url, ARTWORK_DOWNLOADED if downloaded else ARTWORK_SKIPPED)
+        
+    def _mark_processed(self, url):
+        """Record a URL as processed, returns False if another worker already took it"""
+        with self.lock:
+            if url in self.processed_urls:
+                return False
+            self.processed_urls.add(url)
+            return True
     
     def download_image(self, img_url, base_url):
-        """Downloads the image from the URL and ensures it's in JPG format"""
+        """Downloads the image from the URL and ensures it's in JPG format, returns True when saved, False when rejected, None when failed"""
         try:
             # Get the file extension from the URL or content-type
             parsed_url = urlparse(img_url)
@@ -79,27 +498,64 @@ class DeviantArtScraper:
                     return self.download_image(image_urls[0], base_url)
                 else:
                     return False
+                    
+            # Tokens in the query change between sessions, the path identifies the image
+            image_key = img_url.split('?')[0]
+            with self.lock:
+                if image_key in self.known_image_urls:
+                    self.skipped_duplicates += 1
+                    return False
             
-            # Download the image content
-            response = requests.get(img_url, headers=self.headers, stream=True)
-            if response.status_code != 200:
-                return False
+            # Download the image content; the with block hands the connection back
+            # to the pooled session on every return, including the early ones
+            with self._get(img_url, stream=True) as response:
+                if response.status_code != 200:
+                    return None
+                
+                # Get content type from response headers
+                content_type = response.headers.get('Content-Type', '')
+                
+                # Skip if not an image content type
+                if 'image' not in content_type:
+                    return False
+                
+                # Read just enough of the stream to get the dimensions from the header
+                chunks = response.iter_content(PROBE_CHUNK_SIZE)
+                head = b''
+                size = None
+                for chunk in chunks:
+                    head += chunk
+                    size = probe_image_size(head)
+                    if size or len(head) >= PROBE_MAX_BYTES:
+                        break
+                
+                # Skip small images that are likely icons without fetching the rest
+                if size and (size[0] < MIN_IMAGE_SIZE or size[1] < MIN_IMAGE_SIZE):
+                    self._record_early_skip(response, len(head))
+                    return False
+                
+                data = head + b''.join(chunks)
             
-            # Get content type from response headers
-            content_type = response.headers.get('Content-Type', '')
+            content_hash = hashlib.new(INDEX_HASH_ALGORITHM, data).hexdigest()
             
-            # Skip if not an image content type
-            if 'image' not in content_type:
-                return False
-                
-            # Check image size before downloading completely
+            # Check image size after downloading completely (formats the probe can't read)
             try:
-                img = Image.open(io.BytesIO(response.content))
+                img = Image.open(io.BytesIO(data))
                 width, height = img.size
                 
                 # Skip small images that are likely icons (under 500px width or height)
-                if width < 500 or height < 500:
+                if width < MIN_IMAGE_SIZE or height < MIN_IMAGE_SIZE:
                     return False
+                    
+                # Same content under another URL, already saved by this or an earlier run
+                if not self._claim_hash(content_hash):
+                    return False
+                    
+                # Claim a number under the lock so parallel workers never share one
+                image_number = self._reserve_slot()
+                if image_number is None:
+                    self._release_hash(content_hash)
+                    return None
                 
                 # Generate a base filename without extension (will add .jpg later)
                 if not file_name or file_name == '':
@@ -111,97 +567,50 @@ class DeviantArtScraper:
                 
                 # Add timestamp to prevent overwriting
                 timestamp = int(time.time())
-                file_name = f"{self.downloaded_count + 1}_{file_name}_{timestamp}.jpg"  # Force JPG extension with counter
+                file_name = f"{image_number}_{file_name}_{timestamp}.jpg"  # Force JPG extension with counter
                 
                 # Full path to save the image
                 file_path = os.path.join(self.output_dir, file_name)
                 
-                # If image has transparency (like PNG with alpha channel), convert to RGB
-                if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
-                    img = background
-                
-                # Save as JPG
-                img.convert('RGB').save(file_path, 'JPEG', quality=95)
-                
-                # Create progress bar on first successful download
-                if self.progress_bar is None:
-                    self.progress_bar = tqdm(total=self.max_images, desc="Downloading images", unit="img")
+                saved = False
+                try:
+                    # If image has transparency (like PNG with alpha channel), convert to RGB
+                    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                        background = Image.new('RGB', img.size, (255, 255, 255))
+                        background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
+                        img = background
+                    
+                    # Save as JPG
+                    img.convert('RGB').save(file_path, 'JPEG', quality=95)
+                    saved = True
+                finally:
+                    self._release_slot(saved)
+                    if not saved:
+                        self._release_hash(content_hash)
                 
-                self.progress_bar.write(f"✅ Downloaded & converted: {file_name}")
+                self._record_image(image_key, base_url, content_hash, file_path)
+                self._write(f"✅ Downloaded & converted: {file_name}")
                 return True
                 
             except Exception as e:
                 return False
                 
         except Exception as e:
-            return False
+            return None
     
     def extract_image_urls(self, page_url):
-        # Skip if we've already processed this URL
-        if page_url in self.processed_urls:
-            return []
-        
-        # Add URL to processed set
+        # Skip if we (or another worker) already processed this URL
         base_url = page_url.split('#')[0]  # Remove any fragment part
-        self.processed_urls.add(base_url)
+        if not self._mark_processed(base_url):
+            return []
         
         image_urls = []
         try:
-            response = requests.get(base_url, headers=self.headers)
+            response = self._get(base_url)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Method 1: Try to find the download button href - best quality option
-                download_buttons = soup.select('a[data-hook="download_button"]')
-                if download_buttons:
-                    for button in download_buttons:
-                        href = button.get('href')
-                        if href:
-                            image_urls.append(href)
-                            return image_urls  # This is likely the best quality image
-                
-                # Method 2: Find main full-resolution image
-                main_img = soup.select_one('img[data-hook="deviation_std_img"]')
-                if main_img and main_img.get('src'):
-                    img_url = main_img.get('src')
-                    # Try to get full-resolution version
-                    img_url = re.sub(r'/v\d+/.*?/', '/f/', img_url)
-                    img_url = img_url.replace('/200H/', '/').replace('/250/', '/')
-                    img_url = img_url.replace('/400T/', '/').replace('/300W/', '/')
-                    image_urls.append(img_url)
-                    return image_urls
-                
-                # Method 3: Look for other image elements that might be full-sized artwork
-                image_elements = []
-                image_elements.extend(soup.select('img.dev-content-full'))
-                image_elements.extend(soup.select('img.dev-content-normal'))
-                image_elements.extend(soup.select('img.fullview'))
-                
-                # If still not found, look for any reasonable sized images
-                if not image_elements:
-                    for img in soup.find_all('img'):
-                        src = img.get('src', '')
-                        # Only consider DeviantArt or wixmp (their CDN) images
-                        if (('deviantart' in src or 'wixmp.com' in src) and 
-                            not any(pattern in src.lower() for pattern in ['/avatars/', '/icons/', '/emoticons/', '/thumbs/', 'thumbnail', 'icon', 'avatar'])):
-                            
-                            # Check if it has width attribute and it's big enough
-                            width = img.get('width')
-                            if width and int(width) >= 500:
-                                image_elements.append(img)
-                            # Or add it if it seems like a content image
-                            elif re.search(r'/f/|/intermediary/|/pre\d+/', src):
-                                image_elements.append(img)
-                
-                for img in image_elements:
-                    img_url = img.get('src') or img.get('data-src')
-                    if img_url:
-                        # Try to get full-resolution version
-                        img_url = img_url.replace('/200H/', '/').replace('/250/', '/')
-                        img_url = img_url.replace('/400T/', '/').replace('/300W/', '/')
-                        image_urls.append(img_url)
+                # Only <a> and <img> are queried, so the rest of the page is not built
+                soup = make_soup(response.text, LINK_AND_IMAGE_TAGS)
+                image_urls = find_image_urls(soup)
                 
                 if not image_urls:
                     # If no images found, we'll still return the artwork page itself
@@ -212,81 +621,179 @@ class DeviantArtScraper:
         
         return image_urls
     
+    def search_page_images(self, html):
+        """Map artwork links to full-size image URLs using the search page's initial state, returns (images, skipped)"""
+        state = parse_initial_state(html)
+        deviations = ((state or {}).get('@@entities') or {}).get('deviation') or {}
+        images = {}
+        skipped = set()
+        for deviation in deviations.values():
+            link = (deviation.get('url') or '').split('#')[0]
+            image = deviation_image(deviation)
+            if not link or not image:
+                continue
+            img_url, width, height = image
+            # Too small to keep, no need to fetch the artwork page either
+            if width and height and (width < MIN_IMAGE_SIZE or height < MIN_IMAGE_SIZE):
+                skipped.add(link)
+            else:
+                images[link] = img_url
+        return images, skipped
+        
+    def process_artwork(self, link, img_url=None):
+        """Download one artwork (runs on a worker), returns True when saved, False when nothing to keep, None when unfinished"""
+        if img_url:
+            result = self.download_image(img_url, link)
+            if result is not None:
+                return result
+        
+        # No usable image URL from the search page, parse the artwork page
+        outcome = None
+        image_urls = self.extract_image_urls(link)
+        for img_url in image_urls:
+            if self._reached_max():
+                return outcome or None
+            result = self.download_image(img_url, link)
+            if result:
+                outcome = True
+            elif result is False and outcome is None:
+                outcome = False
+        return outcome
+                
+    def _worker(self, links):
+        """Consume (link, image URL, search page) items until the producer sends None"""
+        while True:
+            item = links.get()
+            try:
+                if item is None:
+                    return
+                link, img_url, page = item
+                if self._reached_max():
+                    continue
+                outcome = self.process_artwork(link, img_url)
+                if outcome is not None:
+                    self._record_artwork(link, outcome)
+                    with self.lock:
+                        self.pending_pages[page] -= 1
+            except Exception as e:
+                self._write(f"❌ Error processing {item[0]}: {e}")
+            finally:
+                links.task_done()
+                
+    def _resume_page(self, next_page, incomplete_page, exhausted):
+        """Search page the next run should start from"""
+        with self.lock:
+            unfinished = [page for page, count in self.pending_pages.items() if count > 0]
+        if incomplete_page:
+            unfinished.append(incomplete_page)
+        if unfinished:
+            return min(unfinished)
+        # Once the results ran out, start over so a later run picks up newly posted artworks
+        return 1 if exhausted else next_page
+                
     def search_and_download(self):
-        page = 1
+        """Walk the search pages, feeding artwork links to a pool of workers"""
+        page = self.index.resume_page(self.topic)
         consecutive_empty_pages = 0
         max_empty_pages = 3  # Stop after 3 consecutive empty pages
+        incomplete_page = None  # page whose artworks were not all queued
         
-        while self.downloaded_count < self.max_images and consecutive_empty_pages < max_empty_pages:
-            # DeviantArt search URL
-            search_term = quote_plus(self.topic)
-            search_url = f"https://www.deviantart.com/search?q={search_term}&page={page}"
+        if page > 1:
+            print(f"↩️  Resuming '{self.topic}' from search page {page}")
+        if self.known_image_urls:
+            print(f"🗂️  {len(self.known_image_urls)} images already downloaded for '{self.topic}', skipping them")
+        
+        self.progress_bar = tqdm(total=self.max_images, desc="Downloading images", unit="img")
+        # Bounded so the search stays at most a few pages ahead of the downloads
+        links = queue.Queue(maxsize=self.workers * QUEUE_PER_WORKER)
+        threads = [threading.Thread(target=self._worker, args=(links,), name=f"deviantart-{index}", daemon=True)
+                   for index in range(self.workers)]
+        for thread in threads:
+            thread.start()
             
-            # Use print instead of progress_bar.write since progress_bar might not exist yet
-            print(f"🔍 Searching page {page} for '{self.topic}'...")
-            try:
-                response = requests.get(search_url, headers=self.headers)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Find artwork links
-                    artwork_links = []
-                    for a in soup.find_all('a', href=True):
-                        href = a['href']
-                        # DeviantArt artwork URLs usually follow this pattern
-                        if re.search(r'deviantart\.com/[^/]+/art/', href):
-                            # Remove any fragments and duplicates
-                            base_href = href.split('#')[0]
-                            if base_href not in artwork_links:
+        queued = set()
+        try:
+            while not self._reached_max() and consecutive_empty_pages < max_empty_pages:
+                # DeviantArt search URL
+                search_term = quote_plus(self.topic)
+                search_url = f"https://www.deviantart.com/search?q={search_term}&page={page}"
+                
+                self._write(f"🔍 Searching page {page} for '{self.topic}'...")
+                try:
+                    response = self._get(search_url)
+                    if response.status_code == 200:
+                        # Fast path: image URLs straight from the embedded search results
+                        page_images, page_skipped = self.search_page_images(response.text)
+                        
+                        soup = make_soup(response.text, LINK_TAGS)
+                        
+                        # Find artwork links
+                        artwork_links = list(page_images)
+                        for base_href in find_artwork_links(soup):
+                            if base_href not in artwork_links and base_href not in page_skipped:
                                 artwork_links.append(base_href)
-                    
-                    if not artwork_links:
-                        consecutive_empty_pages += 1
-                        print(f"❌ No artwork links found on page {page}. Empty pages: {consecutive_empty_pages}/{max_empty_pages}")
-                        page += 1
-                        time.sleep(random.uniform(1.5, 3.0))  # Reduced delay
-                        continue
-                    else:
-                        consecutive_empty_pages = 0  # Reset counter when we find links
-                    
-                    print(f"📊 Page {page}: Found {len(artwork_links)} artworks")
-                    
-                    # Process each artwork page
-                    for link in artwork_links:
-                        if self.downloaded_count >= self.max_images:
-                            break
                         
-                        image_urls = self.extract_image_urls(link)
+                        if not artwork_links and not page_skipped:
+                            consecutive_empty_pages += 1
+                            self._write(f"❌ No artwork links found on page {page}. Empty pages: {consecutive_empty_pages}/{max_empty_pages}")
+                            page += 1
+                            continue
+                        else:
+                            consecutive_empty_pages = 0  # Reset counter when we find links
+                        
+                        self._write(f"📊 Page {page}: Found {len(artwork_links)} artworks "
+                                    f"({len(page_images)} resolved from the search page)")
                         
-                        for img_url in image_urls:
-                            if self.downloaded_count >= self.max_images:
+                        # Hand the new artworks to the workers, blocks while the queue is full
+                        for link in artwork_links:
+                            if self._reached_max():
+                                incomplete_page = incomplete_page or page
                                 break
-                                
-                            # Download the image
-                            if self.download_image(img_url, link):
-                                self.downloaded_count += 1
-                                if self.progress_bar:  # Only update if progress bar exists
-                                    self.progress_bar.update(1)
-                                
-                                # Brief delay between downloads (reduced)
-                                time.sleep(random.uniform(0.3, 1.0))
-                    
-                    # If we still need more images, move to the next page
-                    if self.downloaded_count < self.max_images:
+                            if link in queued:
+                                continue
+                            queued.add(link)
+                            if link in self.visited_artworks:
+                                self.skipped_visited += 1
+                                continue
+                            if link in page_images:
+                                self.resolved_from_search += 1
+                            with self.lock:
+                                self.pending_pages[page] += 1
+                            links.put((link, page_images.get(link), page))
+                        
                         page += 1
-                        # Random delay between page requests (reduced)
-                        time.sleep(random.uniform(1.5, 3.0))
                     else:
+                        self._write(f"❌ Failed to access search page. Status code: {response.status_code}")
                         break
-                else:
-                    print(f"❌ Failed to access search page. Status code: {response.status_code}")
+                except Exception as e:
+                    self._write(f"❌ Error during search: {e}")
                     break
-            except Exception as e:
-                print(f"❌ Error during search: {e}")
-                break
+        except KeyboardInterrupt:
+            self._write("\nℹ️  Download interrupted by user")
+            # Drop whatever is still queued so the workers stop quickly
+            with self.lock:
+                self.max_images = min(self.max_images, self.downloaded_count + self.in_flight)
+        finally:
+            # Let the workers finish what is queued, then stop them
+            for _ in threads:
+                links.put(None)
+            for thread in threads:
+                thread.join()
+                
+            resume_page = self._resume_page(page, incomplete_page, consecutive_empty_pages >= max_empty_pages)
+            self.index.save_resume_page(self.topic, resume_page)
+            self.index.close()
         
         if self.progress_bar:
             self.progress_bar.close()
+        if self.skipped_visited or self.skipped_duplicates:
+            print(f"\n🗂️  Skipped {self.skipped_visited} artworks visited by earlier runs "
+                  f"and {self.skipped_duplicates} images already downloaded")
+        if self.resolved_from_search:
+            print(f"\n⚡ {self.resolved_from_search} artworks resolved from search page data")
+        if self.skipped_early:
+            print(f"\n⏭️  Skipped {self.skipped_early} small images from their headers, "
+                  f"saving {self.bytes_saved / (1024 * 1024):.1f} MB of transfer")
         print(f"\n🎉 Downloaded {self.downloaded_count} images related to '{self.topic}' to '{self.output_dir}'")
 
 def main():
@@ -315,6 +822,12 @@ def main():
     
     output_dir = input(f"Enter output directory (default 'DeviantArt'): ") or "DeviantArt"
     
+    try:
+        workers = int(input("Enter number of parallel workers (default 4): ") or 4)
+    except ValueError:
+        workers = 4
+        print("⚠️  Invalid input. Using 4 workers.")
+    
     print(f"Will download up to {max_images} images to folder: '{output_dir}/{topic}'")
     print(f"🚀 Start DeviantArt image downloader for topic: '{topic}'?")
     
@@ -323,7 +836,7 @@ def main():
         print("❌ Operation cancelled.")
         return
     
-    scraper = DeviantArtScraper(topic, max_images, output_dir)
+    scraper = DeviantArtScraper(topic, max_images, output_dir, workers)
     scraper.search_and_download()
 
 if __name__ == "__main__":
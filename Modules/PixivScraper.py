@@ -7,14 +7,443 @@ from urllib.parse import urljoin, urlparse, quote
 from pathlib import Path
 import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from datetime import datetime
 import re
 import sys
+import shutil
+import tempfile
+import argparse
+import threading
+import bisect
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from PIL import Image
 import io
 from tqdm import tqdm
 
+# Starting requests per second per host (API and image CDN are paced separately).
+# The adaptive controller moves each rate between MIN_RATE and rate * MAX_RATE_FACTOR.
+HOST_RATE_LIMITS = {
+    'www.pixiv.net': 3.0,
+    'i.pximg.net': 8.0,
+}
+DEFAULT_RATE_LIMIT = 2.0
+MIN_RATE = 0.2
+MAX_RATE_FACTOR = 4.0
+
+# AIMD tuning: each healthy response adds RATE_INCREASE req/s, throttling
+# (429/503, timeouts) or latency above LATENCY_CEILING multiplies by RATE_DECREASE.
+# Decreases closer together than DECREASE_COOLDOWN count once, since a burst of
+# in-flight requests reports the same overload.
+RATE_INCREASE = 0.05
+RATE_DECREASE = 0.5
+LATENCY_CEILING = 5.0
+DECREASE_COOLDOWN = 1.0
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# The progress bar reports requests completed over the last REQUEST_RATE_WINDOW seconds
+REQUEST_RATE_WINDOW = 10.0
+
+# Retry budget shared by request retries and download retries: every first
+# attempt earns RETRY_BUDGET_RATIO of a retry, up to RETRY_BUDGET_CAP banked
+MAX_ATTEMPTS = 4
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_RESERVE = 10
+RETRY_BUDGET_CAP = 50
+
+# Database tuning: writes are committed every DB_BATCH_SIZE rows or DB_BATCH_SECONDS
+DB_BATCH_SIZE = 50
+DB_LOOKUP_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+DB_BATCH_SECONDS = 5.0
+DB_BUSY_TIMEOUT_MS = 30000
+DB_CACHED_STATEMENTS = 256
+
+# page_index given to multi-page rows migrated from the old one-row-per-artwork
+# schema. Which page they hold is unknown, so they mark the whole artwork done,
+# exactly as the old schema treated them.
+LEGACY_PAGE_INDEX = -1
+
+# How an artwork already downloaded under another tag shows up in a later tag's folder
+LINK_HARDLINK = 'hardlink'
+LINK_MANIFEST = 'manifest'
+LINK_MODES = (LINK_HARDLINK, LINK_MANIFEST)
+MANIFEST_NAME = 'manifest.txt'
+
+# Search responses are cached on disk and reused for this many seconds
+SEARCH_CACHE_TTL = 6 * 60 * 60
+
+# Image bytes are hashed while they stream in, in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Downloads larger than this are spooled to a temp file instead of memory
+SPOOL_MEMORY_LIMIT = 8 * 1024 * 1024
+SPOOL_DIR_NAME = '.partial'
+DEFAULT_HASH_ALGORITHM = 'blake2b'
+LEGACY_HASH_ALGORITHM = 'md5'  # rows written before hash_algorithm was stored
+
+# Files reconcile considers part of the download tree
+IMAGE_FILE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+# Stage latency histogram buckets (seconds), fixed so recording is one lock and a few adds,
+# and metric export settings.
+# The Prometheus textfile is rewritten every METRICS_INTERVAL seconds during a run.
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_INTERVAL = 15.0
+METRICS_PREFIX = 'pixiv'
+
+# Pre-download filters (see ArtworkFilter); aiType 2 marks AI-generated works
+FILTER_ANY = 'any'
+FILTER_EXCLUDE = 'exclude'
+FILTER_ONLY = 'only'
+FILTER_MODES = (FILTER_ANY, FILTER_EXCLUDE, FILTER_ONLY)
+FILTER_REASONS = ('resolution', 'aspect', 'ai_type', 'r18', 'page_count', 'bookmarks')
+AI_TYPE_GENERATED = 2
+
+# Where bulk_download_sources gets its artworks: tag search, a user's
+# portfolio (with or without manga) or a user's public/private bookmarks
+SOURCE_TAG = 'tag'
+SOURCE_USER = 'user'
+SOURCE_USER_ILLUSTS = 'user_illusts'
+SOURCE_BOOKMARKS = 'bookmarks'
+SOURCE_PRIVATE_BOOKMARKS = 'private_bookmarks'
+SOURCE_KINDS = (SOURCE_TAG, SOURCE_USER, SOURCE_USER_ILLUSTS, SOURCE_BOOKMARKS, SOURCE_PRIVATE_BOOKMARKS)
+SOURCE_LABELS = {SOURCE_TAG: 'Tag', SOURCE_USER: 'User', SOURCE_USER_ILLUSTS: 'User',
+                 SOURCE_BOOKMARKS: 'Bookmarks of', SOURCE_PRIVATE_BOOKMARKS: 'Private bookmarks of'}
+SOURCE_ICONS = {SOURCE_TAG: '🏷️ ', SOURCE_USER: '👤', SOURCE_USER_ILLUSTS: '👤',
+                SOURCE_BOOKMARKS: '🔖', SOURCE_PRIVATE_BOOKMARKS: '🔖'}
+USER_WORKS_BATCH = 48  # IDs per profile/illusts call
+BOOKMARKS_PAGE_SIZE = 100  # the most the bookmarks endpoint returns per call
+
+# Pages of one multi-page work fetched at the same time
+PAGE_CONCURRENCY = 4
+
+# Downloaded buffers allowed to wait for the PNG encoders, per encoder process
+TRANSCODE_QUEUE_PER_ENCODER = 4
+
+# Storage modes: re-encode everything to PNG, or keep the original bytes untouched
+STORAGE_PNG = 'png'
+STORAGE_ORIGINAL = 'original'
+STORAGE_MODES = (STORAGE_PNG, STORAGE_ORIGINAL)
+
+# Original-image URLs derived from search thumbnails (see derive_original_urls):
+# .../img-master/img/2024/01/02/03/04/05/123_p0_square1200.jpg is stored as
+# .../img-original/img/2024/01/02/03/04/05/123_p0.<ext>, with an extension the
+# thumbnail does not reveal, so every likely one is tried, most common first
+THUMBNAIL_PATH_RE = re.compile(r'/img/(\d{4}/\d{2}/\d{2}/\d{2}/\d{2}/\d{2})/(\d+)_p0')
+ORIGINAL_IMAGE_BASE = 'https://i.pximg.net/img-original/img'
+ORIGINAL_EXTENSIONS = ('.jpg', '.png', '.gif')
+ILLUST_TYPE_UGOIRA = 2
+
+# Leading magic bytes -> file extension
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'BM', '.bmp'),
+)
+
+# Statements are kept as constants so sqlite3 reuses the prepared versions
+CREATE_DOWNLOADS_SQL = '''
+    CREATE TABLE IF NOT EXISTS downloads (
+        artwork_id INTEGER NOT NULL,
+        page_index INTEGER NOT NULL DEFAULT 0,
+        title TEXT,
+        artist_name TEXT,
+        artist_id INTEGER,
+        tags TEXT,
+        file_path TEXT,
+        file_hash TEXT,
+        download_date TEXT,
+        page_count INTEGER DEFAULT 1,
+        bookmark_count INTEGER DEFAULT 0,
+        like_count INTEGER DEFAULT 0,
+        view_count INTEGER DEFAULT 0,
+        width INTEGER,
+        height INTEGER,
+        r18 BOOLEAN DEFAULT FALSE,
+        ai_type INTEGER DEFAULT 0,
+        source_tag TEXT,
+        original_url TEXT,
+        image_number INTEGER,
+        source_hash TEXT,
+        hash_algorithm TEXT,
+        storage_mode TEXT DEFAULT 'png',
+        PRIMARY KEY (artwork_id, page_index)
+    )
+'''
+SELECT_PAGES_SQL = 'SELECT artwork_id, page_index, page_count, file_path FROM downloads WHERE artwork_id = ?'
+SELECT_PAGES_IN_SQL = 'SELECT artwork_id, page_index, page_count, file_path FROM downloads WHERE artwork_id IN ({})'
+SELECT_SOURCE_HASH_SQL = '''
+    SELECT file_path, file_hash, storage_mode FROM downloads
+    WHERE source_hash = ? AND hash_algorithm = ? LIMIT 1
+'''
+SELECT_TAG_PROGRESS_SQL = 'SELECT last_completed_page, last_page FROM tag_progress WHERE tag = ?'
+SAVE_TAG_PROGRESS_SQL = '''
+    INSERT INTO tag_progress (tag, last_completed_page, last_page, updated)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(tag) DO UPDATE SET
+        last_completed_page = excluded.last_completed_page,
+        last_page = excluded.last_page,
+        updated = excluded.updated
+'''
+SELECT_RECONCILE_SQL = 'SELECT artwork_id, page_index, file_path, file_hash, hash_algorithm FROM downloads'
+UPDATE_FILE_PATH_SQL = 'UPDATE downloads SET file_path = ? WHERE artwork_id = ? AND page_index = ?'
+DELETE_DOWNLOAD_SQL = 'DELETE FROM downloads WHERE artwork_id = ?'
+DELETE_PAGE_SQL = 'DELETE FROM downloads WHERE artwork_id = ? AND page_index = ?'
+
+# Normalized artwork -> tag rows and a full-text index over titles and tags
+# (rowid = artwork_id) for building subsets without scanning downloads
+CREATE_ARTWORK_TAGS_SQL = '''
+    CREATE TABLE IF NOT EXISTS artwork_tags (
+        artwork_id INTEGER NOT NULL,
+        tag TEXT NOT NULL COLLATE NOCASE,
+        PRIMARY KEY (artwork_id, tag)
+    ) WITHOUT ROWID
+'''
+CREATE_DOWNLOADS_FTS_SQL = 'CREATE VIRTUAL TABLE IF NOT EXISTS downloads_fts USING fts5(title, tags)'
+# PRAGMA user_version from which the tag index has been backfilled
+TAG_INDEX_VERSION = 1
+INSERT_ARTWORK_TAG_SQL = 'INSERT OR IGNORE INTO artwork_tags (artwork_id, tag) VALUES (?, ?)'
+UPSERT_DOWNLOADS_FTS_SQL = 'INSERT OR REPLACE INTO downloads_fts (rowid, title, tags) VALUES (?, ?, ?)'
+DELETE_ARTWORK_TAGS_SQL = 'DELETE FROM artwork_tags WHERE artwork_id = ?'
+DELETE_DOWNLOADS_FTS_SQL = 'DELETE FROM downloads_fts WHERE rowid = ?'
+PURGE_ARTWORK_TAGS_SQL = 'DELETE FROM artwork_tags WHERE artwork_id NOT IN (SELECT artwork_id FROM downloads)'
+PURGE_DOWNLOADS_FTS_SQL = 'DELETE FROM downloads_fts WHERE rowid NOT IN (SELECT artwork_id FROM downloads)'
+
+QUERY_COLUMNS = ('artwork_id', 'page_index', 'file_path', 'title', 'tags', 'image_number')
+
+# What older versions stored in downloads.tags for rows saved from the
+# details endpoint (the keys of its tags object); the real tags are lost
+LEGACY_DETAILS_TAGS = 'authorId,isLocked,tags,writable'
+
+INSERT_DOWNLOAD_SQL = '''
+    INSERT OR REPLACE INTO downloads 
+    (artwork_id, page_index, title, artist_name, artist_id, tags, file_path, file_hash, 
+     download_date, page_count, bookmark_count, like_count, view_count,
+     width, height, r18, ai_type, source_tag, original_url, image_number,
+     source_hash, hash_algorithm, storage_mode)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def extract_tags(artwork_data):
+    """Return the tag names of a search result or illust details body"""
+    # Search results carry a plain list of names, the details endpoint a {'tags': [{'tag': name}, ...]} object
+    tags = artwork_data.get('tags') or []
+    if isinstance(tags, dict):
+        tags = [entry.get('tag') for entry in tags.get('tags', []) if isinstance(entry, dict)]
+    names = []
+    for tag in tags:
+        tag = str(tag).strip() if tag is not None else ''
+        if tag and tag not in names:
+            names.append(tag)
+    return names
+
+def migrate_to_page_rows(cursor):
+    """Rebuild an old downloads table keyed on artwork_id alone as (artwork_id, page_index)"""
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(downloads)')]
+    if 'page_index' in columns:
+        return
+        
+    # Single-page rows become page 0; multi-page rows only ever held the last
+    # page written, so they get LEGACY_PAGE_INDEX
+    print("🔧 Migrating download database to per-page tracking...")
+    cursor.execute('BEGIN')
+    cursor.execute('ALTER TABLE downloads RENAME TO downloads_legacy')
+    cursor.execute(CREATE_DOWNLOADS_SQL)
+    
+    new_columns = {row[1] for row in cursor.execute('PRAGMA table_info(downloads)')}
+    shared = ', '.join(column for column in columns if column in new_columns)
+    cursor.execute(f'''
+        INSERT INTO downloads ({shared}, page_index)
+        SELECT {shared}, CASE WHEN COALESCE(page_count, 1) > 1 THEN ? ELSE 0 END
+        FROM downloads_legacy
+    ''', (LEGACY_PAGE_INDEX,))
+    cursor.execute('DROP TABLE downloads_legacy')
+    cursor.connection.commit()
+
+def ensure_tag_index(cursor):
+    """Create the artwork-tag table and FTS index, backfilling them from downloads; returns True when FTS5 is available"""
+    cursor.execute(CREATE_ARTWORK_TAGS_SQL)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_artwork_tags_tag ON artwork_tags(tag, artwork_id)')
+    try:
+        cursor.execute(CREATE_DOWNLOADS_FTS_SQL)
+        fts_enabled = True
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5, the tag table still works but text search does not
+        fts_enabled = False
+        
+    # The comma-joined column cannot be used for tag queries, its index only costs writes
+    cursor.execute('DROP INDEX IF EXISTS idx_downloads_tags')
+    
+    # Backfill once for databases created before the index existed; rows saved
+    # from the details body have no tags, so an empty table is not a reliable marker
+    if cursor.execute('PRAGMA user_version').fetchone()[0] < TAG_INDEX_VERSION:
+        rows = cursor.execute('''
+            SELECT artwork_id, MAX(title), MAX(tags) FROM downloads GROUP BY artwork_id
+        ''').fetchall()
+        if rows:
+            print(f"🔧 Building tag index for {len(rows)} downloaded artworks...")
+        tag_rows = []
+        fts_rows = []
+        for artwork_id, title, tags in rows:
+            names = [] if tags in (None, LEGACY_DETAILS_TAGS) else extract_tags({'tags': tags.split(',')})
+            tag_rows.extend((artwork_id, name) for name in names)
+            fts_rows.append((artwork_id, title or '', ' '.join(names)))
+        cursor.executemany(INSERT_ARTWORK_TAG_SQL, tag_rows)
+        if fts_enabled:
+            cursor.executemany(UPSERT_DOWNLOADS_FTS_SQL, fts_rows)
+        cursor.execute(f'PRAGMA user_version = {TAG_INDEX_VERSION}')
+    return fts_enabled
+
+def query_downloads(db, tags=(), exclude_tags=(), match=None, source_tag=None, limit=None,
+                    order_by_number=False):
+    """Select downloaded pages through the tag index as (artwork_id, page_index, file_path, title, tags, image_number) rows"""
+    # tags must all be present and exclude_tags none of them (exact names),
+    # match is an FTS5 query over titles and tags
+    conditions = []
+    params = []
+    tags = list({tag.casefold(): tag for tag in tags}.values())
+    if tags:
+        conditions.append(f'''d.artwork_id IN (
+            SELECT artwork_id FROM artwork_tags WHERE tag IN ({','.join('?' * len(tags))})
+            GROUP BY artwork_id HAVING COUNT(*) = ?)''')
+        params.extend(tags)
+        params.append(len(tags))
+    if exclude_tags:
+        conditions.append(f'''d.artwork_id NOT IN (
+            SELECT artwork_id FROM artwork_tags WHERE tag IN ({','.join('?' * len(exclude_tags))}))''')
+        params.extend(exclude_tags)
+    if match:
+        conditions.append('d.artwork_id IN (SELECT rowid FROM downloads_fts WHERE downloads_fts MATCH ?)')
+        params.append(match)
+    if source_tag:
+        conditions.append('d.source_tag = ?')
+        params.append(source_tag)
+        
+    sql = 'SELECT d.artwork_id, d.page_index, d.file_path, d.title, d.tags, d.image_number FROM downloads d'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    # image_number is the download order across runs
+    sql += ' ORDER BY d.image_number, d.artwork_id' if order_by_number else ' ORDER BY d.artwork_id, d.page_index'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return db.execute(sql, params).fetchall()
+
+def path_key(path):
+    """Normalise a path for comparison, whatever directory it was recorded from"""
+    return os.path.normcase(os.path.abspath(path))
+
+def scan_image_tree(root):
+    """Return {path_key: path} for every image file under root, in one os.scandir walk"""
+    files = {}
+    pending = [str(root)]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Paths are built from root as given, like the downloader builds them;
+                        # hidden directories (the download spool) are skipped
+                        if not entry.name.startswith('.'):
+                            pending.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_FILE_EXTENSIONS):
+                        files[path_key(entry.path)] = entry.path
+        except OSError:
+            continue
+    return files
+
+def output_filename(artwork_id, page_index, safe_artist):
+    """File name of one page, unique per artwork page so runs and workers never collide"""
+    # The sequential image_number lives in the database (query --order number), not in the name
+    return f"{artwork_id}_p{page_index}_{safe_artist}.png"
+
+def derive_original_urls(thumbnail_url):
+    """Guess the original-image URLs of page 0 from a search-result thumbnail, [] if the URL is unrecognised"""
+    match = THUMBNAIL_PATH_RE.search(thumbnail_url or '')
+    if not match:
+        return []
+    timestamp, artwork_id = match.groups()
+    return [f"{ORIGINAL_IMAGE_BASE}/{timestamp}/{artwork_id}_p0{extension}"
+            for extension in ORIGINAL_EXTENSIONS]
+
+def content_total_size(response, offset=0):
+    """Full size of the file behind a (possibly ranged) response, or None if unknown"""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get('Content-Length', '')
+    if length.isdigit():
+        return int(length) + (offset if response.status_code == 206 else 0)
+    return None
+
+def detect_image_extension(data):
+    """Return the file extension matching the image's magic bytes, or None"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if data[:len(signature)] == signature:
+            return extension
+    return None
+
+def transcode_to_png(image_source, output_path, hash_algorithm):
+    """Decode image bytes or a spool path and write it as PNG in an encoder process, returns (png_hash, stage_timings)"""
+    start = time.perf_counter()
+    
+    # Open image from bytes or from the spool file
+    if isinstance(image_source, (bytes, bytearray)):
+        image_source = io.BytesIO(image_source)
+    with Image.open(image_source) as original:
+        original.load()
+        timings = {'decode': time.perf_counter() - start}
+        return _write_png(original, output_path, hash_algorithm, timings)
+
+def _write_png(img, output_path, hash_algorithm, timings):
+    """Encode an opened image to output_path, see transcode_to_png"""
+    mark = time.perf_counter()
+    # SPEED OPTIMIZATION: Skip unnecessary conversions for already RGB/RGBA images
+    if img.mode == 'RGB':
+        # Already RGB, just save directly
+        pass
+    elif img.mode == 'RGBA':
+        # Already RGBA, just save directly  
+        pass
+    elif img.mode == 'P':
+        # Palette mode - convert to RGBA to preserve transparency
+        img = img.convert('RGBA')
+    elif img.mode == 'LA':
+        # Grayscale with alpha - convert to RGBA
+        img = img.convert('RGBA')
+    else:
+        # Other modes - convert to RGB (fastest)
+        img = img.convert('RGB')
+    
+    # SPEED OPTIMIZATION: Use fast PNG save settings
+    png_buffer = io.BytesIO()
+    img.save(png_buffer, 'PNG', 
+            optimize=False,  # Disable optimization for speed
+            compress_level=1)  # Fastest compression (1-9, 1 is fastest)
+    
+    # Hash the encoded bytes before writing so the file is never re-read
+    png_data = png_buffer.getbuffer()
+    now = time.perf_counter()
+    timings['encode'], mark = now - mark, now
+    hasher = hashlib.new(hash_algorithm)
+    hasher.update(png_data)
+    now = time.perf_counter()
+    timings['png_hash'], mark = now - mark, now
+    with open(output_path, 'wb') as f:
+        f.write(png_data)
+    timings['png_write'] = time.perf_counter() - mark
+        
+    return hasher.hexdigest(), timings
+
 def clear_screen():
     # For Windows
     if os.name == "nt":
@@ -73,36 +502,545 @@ def show_phpsessid_instructions():
     print("5. Find 'PHPSESSID' and copy its value")
     print("=" * 60)
 
+class StageMetrics:
+    """Thread-safe latency histograms and byte counts per pipeline stage"""
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.stages = {}
+        
+    def _stage(self, stage):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = {
+                'count': 0,
+                'seconds': 0.0,
+                'max': 0.0,
+                'bytes': 0,
+                'buckets': [0] * (len(self.buckets) + 1),
+            }
+        return entry
+        
+    def record(self, stage, seconds, nbytes=0):
+        """Add one observation of a stage"""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            entry = self._stage(stage)
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['bytes'] += nbytes
+            entry['buckets'][index] += 1
+            
+    def record_many(self, timings, nbytes=0):
+        """Record a {stage: seconds} dict, e.g. the timings of one transcode"""
+        for stage, seconds in timings.items():
+            self.record(stage, seconds, nbytes)
+            
+    @contextmanager
+    def timer(self, stage, nbytes=0):
+        """Time the body of a with block as one observation of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, nbytes)
+            
+    def _quantile(self, entry, q):
+        """Upper bucket bound holding the q-th observation"""
+        target = q * entry['count']
+        seen = 0
+        for bound, count in zip(self.buckets, entry['buckets']):
+            seen += count
+            if seen >= target:
+                return min(bound, entry['max'])
+        return entry['max']
+        
+    def summary(self):
+        """Return {stage: count, seconds, mean, p50, p90, p99, max, bytes}"""
+        with self.lock:
+            stages = {name: dict(entry, buckets=list(entry['buckets'])) for name, entry in self.stages.items()}
+        return {
+            name: {
+                'count': entry['count'],
+                'total_seconds': round(entry['seconds'], 6),
+                'mean_seconds': round(entry['seconds'] / max(entry['count'], 1), 6),
+                'p50_seconds': round(self._quantile(entry, 0.5), 6),
+                'p90_seconds': round(self._quantile(entry, 0.9), 6),
+                'p99_seconds': round(self._quantile(entry, 0.99), 6),
+                'max_seconds': round(entry['max'], 6),
+                'bytes': entry['bytes'],
+            }
+            for name, entry in sorted(stages.items())
+        }
+        
+    def prometheus_text(self, counters=None, gauges=None):
+        """Render the histograms (and optional counters/gauges) in Prometheus text format"""
+        with self.lock:
+            stages = {name: dict(entry, buckets=list(entry['buckets'])) for name, entry in self.stages.items()}
+        lines = [
+            f'# HELP {METRICS_PREFIX}_stage_seconds Time spent per pipeline stage',
+            f'# TYPE {METRICS_PREFIX}_stage_seconds histogram',
+        ]
+        for name, entry in sorted(stages.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['buckets']):
+                cumulative += count
+                lines.append(f'{METRICS_PREFIX}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRICS_PREFIX}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'{METRICS_PREFIX}_stage_seconds_sum{{stage="{name}"}} {entry["seconds"]:.6f}')
+            lines.append(f'{METRICS_PREFIX}_stage_seconds_count{{stage="{name}"}} {entry["count"]}')
+        lines.append(f'# HELP {METRICS_PREFIX}_stage_bytes_total Bytes handled per pipeline stage')
+        lines.append(f'# TYPE {METRICS_PREFIX}_stage_bytes_total counter')
+        for name, entry in sorted(stages.items()):
+            if entry['bytes']:
+                lines.append(f'{METRICS_PREFIX}_stage_bytes_total{{stage="{name}"}} {entry["bytes"]}')
+        for kind, values in (('counter', counters), ('gauge', gauges)):
+            for name, value in sorted((values or {}).items()):
+                metric = f'{METRICS_PREFIX}_{name}' + ('_total' if kind == 'counter' else '')
+                lines.append(f'# TYPE {metric} {kind}')
+                lines.append(f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+def write_file_atomic(path, text):
+    """Write text to path via a temp file so readers never see a partial file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+class ArtworkFilter:
+    """Pre-download filters evaluated on search-result (or details) metadata"""
+    def __init__(self, min_width=None, min_height=None, min_aspect=None, max_aspect=None,
+                 ai_mode=FILTER_ANY, r18_mode=FILTER_ANY, min_bookmarks=None, max_pages=None):
+        for mode in (ai_mode, r18_mode):
+            if mode not in FILTER_MODES:
+                raise ValueError(f"filter mode must be one of {FILTER_MODES}, got {mode!r}")
+        self.min_width = min_width
+        self.min_height = min_height
+        self.min_aspect = min_aspect
+        self.max_aspect = max_aspect
+        self.ai_mode = ai_mode
+        self.r18_mode = r18_mode
+        self.min_bookmarks = min_bookmarks
+        self.max_pages = max_pages
+        
+    def needs_details(self, artwork_data):
+        """Search results carry no bookmark count, True when details must be fetched before deciding"""
+        return self.min_bookmarks is not None and artwork_data.get('bookmarkCount') is None
+        
+    @staticmethod
+    def _mode_fails(mode, flag):
+        return (mode == FILTER_EXCLUDE and flag) or (mode == FILTER_ONLY and not flag)
+        
+    def check(self, artwork_data):
+        """Return the name of the first filter the artwork fails, or None"""
+        # A value missing from the metadata never fails its filter, and
+        # multi-page works are judged by the size of their first page
+        width = int(artwork_data.get('width') or 0)
+        height = int(artwork_data.get('height') or 0)
+        if width and height:
+            if (self.min_width and width < self.min_width) or (self.min_height and height < self.min_height):
+                return 'resolution'
+            aspect = width / height
+            if (self.min_aspect and aspect < self.min_aspect) or (self.max_aspect and aspect > self.max_aspect):
+                return 'aspect'
+                
+        ai_type = artwork_data.get('aiType')
+        if ai_type is not None and self._mode_fails(self.ai_mode, ai_type == AI_TYPE_GENERATED):
+            return 'ai_type'
+            
+        x_restrict = artwork_data.get('xRestrict')
+        if x_restrict is not None and self._mode_fails(self.r18_mode, x_restrict > 0):
+            return 'r18'
+            
+        if self.max_pages and (artwork_data.get('pageCount') or 1) > self.max_pages:
+            return 'page_count'
+            
+        bookmarks = artwork_data.get('bookmarkCount')
+        if self.min_bookmarks is not None and bookmarks is not None and bookmarks < self.min_bookmarks:
+            return 'bookmarks'
+        return None
+
+class AdaptiveRateLimiter:
+    """Thread-safe per-host pacing driven by an AIMD controller"""
+    def __init__(self, rate_limits=None, default_rate=DEFAULT_RATE_LIMIT):
+        self.initial_rates = dict(HOST_RATE_LIMITS)
+        if rate_limits:
+            self.initial_rates.update(rate_limits)
+        self.default_rate = default_rate
+        self.rates = {}
+        self.next_slot = {}
+        self.last_decrease = {}
+        self.lock = threading.Lock()
+        
+    def _rate(self, host):
+        """Current rate of a host, caller must hold lock"""
+        if host not in self.rates:
+            self.rates[host] = self.initial_rates.get(host, self.default_rate)
+        return self.rates[host]
+        
+    def wait(self, url):
+        """Block until a request to the URL's host is allowed"""
+        host = urlparse(url).netloc
+        
+        # Reserve the next free slot for this host, then sleep outside the lock
+        with self.lock:
+            interval = 1.0 / self._rate(host)
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + interval
+            
+        if slot > now:
+            time.sleep(slot - now)
+            
+    def record(self, url, status=None, latency=None, retry_after=None):
+        """Feed one outcome to the controller (status None means no response)"""
+        host = urlparse(url).netloc
+        with self.lock:
+            rate = self._rate(host)
+            ceiling = self.initial_rates.get(host, self.default_rate) * MAX_RATE_FACTOR
+            throttled = (status is None or status in THROTTLE_STATUSES or
+                         (latency is not None and latency > LATENCY_CEILING))
+            now = time.monotonic()
+            
+            if throttled:
+                if now - self.last_decrease.get(host, 0) >= DECREASE_COOLDOWN:
+                    self.rates[host] = max(MIN_RATE, rate * RATE_DECREASE)
+                    self.last_decrease[host] = now
+            elif status is not None and status < 500:
+                self.rates[host] = min(ceiling, rate + RATE_INCREASE)
+                
+            # Honour the server's own back-off request
+            if retry_after:
+                try:
+                    pause = float(retry_after)
+                except ValueError:
+                    pause = 0
+                if pause > 0:
+                    self.next_slot[host] = max(self.next_slot.get(host, now), now + pause)
+                    
+    def current_rates(self):
+        """Return {host: requests per second} for every host seen so far"""
+        with self.lock:
+            return dict(self.rates)
+
+class RetryBudget:
+    """Retry allowance shared by every retry layer, so retries cannot multiply the load on a struggling server"""
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, reserve=RETRY_BUDGET_RESERVE, cap=RETRY_BUDGET_CAP):
+        self.ratio = ratio
+        self.cap = cap
+        self.balance = float(reserve)
+        self.spent = 0
+        self.denied = 0
+        self.lock = threading.Lock()
+        
+    def deposit(self):
+        with self.lock:
+            self.balance = min(self.cap, self.balance + self.ratio)
+            
+    def withdraw(self):
+        """Take one retry from the budget, returns False if none are left"""
+        with self.lock:
+            if self.balance >= 1:
+                self.balance -= 1
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+
+class DownloadSpool:
+    """Holds one download in memory up to a limit, then in a temp file"""
+    def __init__(self, memory_limit, temp_dir):
+        self.memory_limit = memory_limit
+        self.temp_dir = Path(temp_dir)
+        self.buffer = io.BytesIO()
+        self.file = None
+        self.path = None
+        self.size = 0
+        
+    def write(self, chunk):
+        if self.file is None and self.size + len(chunk) > self.memory_limit:
+            # Roll over to disk so 30-60 MB originals do not sit in memory on every worker
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
+            fd, path = tempfile.mkstemp(suffix='.part', dir=self.temp_dir)
+            self.file = os.fdopen(fd, 'w+b')
+            self.path = Path(path)
+            self.file.write(self.buffer.getbuffer())
+            self.buffer = None
+        (self.file or self.buffer).write(chunk)
+        self.size += len(chunk)
+        
+    def reset(self):
+        """Drop everything received so far"""
+        target = self.file or self.buffer
+        target.seek(0)
+        target.truncate()
+        self.size = 0
+        
+    def head(self, length):
+        """Return the first bytes of the download"""
+        if self.file is None:
+            return self.buffer.getbuffer()[:length].tobytes()
+        self.file.flush()
+        with open(self.path, 'rb') as f:
+            return f.read(length)
+            
+    def source(self):
+        """Return the data as bytes while in memory, or as the temp file path"""
+        if self.file is None:
+            return self.buffer.getvalue()
+        self.file.close()
+        return str(self.path)
+        
+    def save_to(self, output_path):
+        """Write the data to output_path, moving the temp file when there is one"""
+        if self.file is None:
+            with open(output_path, 'wb') as f:
+                f.write(self.buffer.getbuffer())
+            return
+        self.file.close()
+        shutil.move(str(self.path), str(output_path))
+        self.path = None
+        
+    def discard(self):
+        """Release memory and delete the temp file, if any"""
+        self.buffer = None
+        if self.file is not None:
+            self.file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+class TagCursor:
+    """Tracks which search pages of a tag have been fully processed"""
+    def __init__(self, tag, start_page):
+        self.tag = tag
+        self.completed_through = start_page - 1
+        self.remaining = {}
+        self.listed = set()
+        self.blocked = set()
+        
+    def add(self, page):
+        """Count an artwork handed to the workers for this page"""
+        self.remaining[page] = self.remaining.get(page, 0) + 1
+        
+    def listed_page(self, page):
+        """Mark every artwork of the page as handed out (or skipped)"""
+        self.listed.add(page)
+        self.remaining.setdefault(page, 0)
+        
+    def finish(self, page, completed=True):
+        """Count one artwork of the page as done, or block the page if it was cut short"""
+        self.remaining[page] -= 1
+        if not completed:
+            self.blocked.add(page)
+            
+    def advance(self):
+        """Move past every contiguous completed page, returns True if it moved"""
+        # Workers finish artworks out of order, so a page only counts once it
+        # and every page before it have no artworks outstanding
+        moved = False
+        while True:
+            page = self.completed_through + 1
+            if page not in self.listed or page in self.blocked or self.remaining.get(page, 0) > 0:
+                return moved
+            self.completed_through = page
+            moved = True
+
+class ImageMissing(Exception):
+    """A probed image URL answered 404"""
+
+class TranscodeStage:
+    """Process pool that encodes downloaded images to PNG off the network threads"""
+    def __init__(self, encoders=None, max_queue=None, hash_algorithm=DEFAULT_HASH_ALGORITHM, metrics=None):
+        self.encoders = encoders or os.cpu_count() or 1
+        self.max_queue = max_queue or self.encoders * TRANSCODE_QUEUE_PER_ENCODER
+        self.hash_algorithm = hash_algorithm
+        self.metrics = metrics
+        self.executor = ProcessPoolExecutor(max_workers=self.encoders)
+        self.slots = threading.BoundedSemaphore(self.max_queue)
+        self.condition = threading.Condition()
+        self.started = time.monotonic()
+        
+        # Counters, guarded by condition
+        self.depth = 0
+        self.peak_depth = 0
+        self.encoded = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.encode_seconds = 0.0
+        self.blocked_seconds = 0.0
+        
+    def submit(self, image_source, output_path, size, on_done=None):
+        """Queue bytes or a spool path for encoding, returns a future resolving to (png_hash, stage_timings)"""
+        # Blocks once max_queue buffers are waiting, which bounds the memory held
+        # by downloaded bytes and applies back-pressure to the network workers
+        wait_start = time.monotonic()
+        self.slots.acquire()
+        blocked = time.monotonic() - wait_start
+        if self.metrics is not None:
+            self.metrics.record('encode_queue_wait', blocked)
+        with self.condition:
+            self.blocked_seconds += blocked
+            self.depth += 1
+            self.peak_depth = max(self.peak_depth, self.depth)
+            self.bytes_in += size
+            
+        try:
+            future = self.executor.submit(transcode_to_png, image_source, str(output_path), self.hash_algorithm)
+        except Exception:
+            self._finish(None)
+            raise
+        future.add_done_callback(lambda done: self._finish(done, on_done))
+        return future
+        
+    def _finish(self, future, on_done=None):
+        timings = None
+        # on_done runs before the image stops counting towards depth, so drain() also waits for it
+        try:
+            if on_done is not None:
+                on_done(future)
+        except Exception:
+            pass  # on_done reports its own errors, the counters below must still move
+        with self.condition:
+            self.depth -= 1
+            if future is None or future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                timings = future.result()[1]
+                self.encoded += 1
+                self.encode_seconds += sum(timings.values())
+            self.condition.notify_all()
+        if timings is not None and self.metrics is not None:
+            self.metrics.record_many(timings)
+        self.slots.release()
+        
+    def drain(self):
+        """Block until every queued image has been encoded"""
+        with self.condition:
+            while self.depth > 0:
+                self.condition.wait()
+                
+    def stats(self):
+        """Return queue depth and throughput of the encode stage"""
+        with self.condition:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                'queue_depth': self.depth,
+                'peak_queue_depth': self.peak_depth,
+                'encoded': self.encoded,
+                'failed': self.failed,
+                'images_per_sec': self.encoded / elapsed,
+                'mb_in_per_sec': self.bytes_in / elapsed / (1024 * 1024),
+                'encode_seconds': self.encode_seconds,
+                'blocked_seconds': self.blocked_seconds,
+            }
+            
+    def shutdown(self):
+        self.drain()
+        self.executor.shutdown(wait=True)
+
 class SimplifiedPixivDownloader:
-    def __init__(self, phpsessid, download_dir="PixivImages", db_path="pixiv_downloads.db"):
+    def __init__(self, phpsessid, download_dir="PixivImages", db_path="pixiv_downloads.db",
+                 workers=4, rate_limits=None, hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                 storage_mode=STORAGE_PNG, encoders=None, search_cache_dir=None,
+                 search_cache_ttl=SEARCH_CACHE_TTL, spool_memory_limit=SPOOL_MEMORY_LIMIT,
+                 max_image_bytes=None, metrics_json=None, metrics_textfile=None,
+                 metrics_interval=METRICS_INTERVAL, page_concurrency=PAGE_CONCURRENCY,
+                 artwork_filter=None):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"storage_mode must be one of {STORAGE_MODES}, got {storage_mode!r}")
         self.phpsessid = phpsessid
+        self.storage_mode = storage_mode
+        
+        # Artworks failing a filter are skipped before any details call or transfer
+        self.artwork_filter = artwork_filter or ArtworkFilter()
+        
+        # Per-stage timing; the JSON summary is written at the end of a run,
+        # the Prometheus textfile (if set) every metrics_interval seconds
+        self.metrics = StageMetrics()
+        if metrics_json is None:
+            metrics_json = Path(db_path).parent / "pixiv_metrics.json"
+        self.metrics_json = Path(metrics_json) if metrics_json else None
+        self.metrics_textfile = Path(metrics_textfile) if metrics_textfile else None
+        self.metrics_interval = metrics_interval
+        self.metrics_stop = threading.Event()
+        
+        # On-disk cache of search responses (search_cache_ttl=0 disables it)
+        if search_cache_dir is None:
+            search_cache_dir = Path(db_path).parent / "pixiv_search_cache"
+        self.search_cache_dir = Path(search_cache_dir)
+        self.search_cache_ttl = search_cache_ttl
+        
+        # PNG encoding runs in a separate process pool (encoders=0 encodes inline)
+        self.encoders = encoders
+        self.transcoder = None
+        self.hash_algorithm = hash_algorithm
+        hashlib.new(hash_algorithm)  # fail fast on an unknown algorithm
         self.download_dir = Path(download_dir)
         self.db_path = db_path
         self.download_dir.mkdir(exist_ok=True)
         
+        # Per-download memory ceiling, temp files live next to the output so
+        # finished downloads can be moved into place; max_image_bytes=None means no limit
+        self.spool_memory_limit = spool_memory_limit
+        self.spool_dir = self.download_dir / SPOOL_DIR_NAME
+        self.max_image_bytes = max_image_bytes
+        
+        # Concurrency settings
+        self.workers = max(1, workers)
+        self.page_concurrency = max(1, page_concurrency)
+        self.rate_limiter = AdaptiveRateLimiter(rate_limits)
+        self.retry_budget = RetryBudget()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.in_flight = 0
+        self.request_times = deque()  # completion times inside REQUEST_RATE_WINDOW
+        
         # Statistics
         self.stats = {
             'downloaded': 0,
             'skipped': 0,
             'failed': 0,
             'total_found': 0,
-            'converted': 0
+            'converted': 0,
+            'kept_original': 0,
+            'duplicates': 0,
+            'pages_skipped': 0,
+            'linked': 0,
+            'details_skipped': 0,
+            'resumed_transfers': 0,
+            'oversized': 0,
+            'derived_url_misses': 0,
+            'bytes_downloaded': 0
         }
+        self.stats.update({f'filtered_{reason}': 0 for reason in FILTER_REASONS})
+        self.run_started = time.monotonic()
+        self.link_mode = LINK_HARDLINK
         
-        # Image counter for numbering
+        # Sequential image numbers, continued from the database in init_database
         self.image_counter = 1
         
+        # Cached directory listings for batched file-existence checks
+        self.dir_listings = {}
+        
         # Progress bar (will be initialized when we know max_images)
         self.progress_bar = None
         
-        # Setup session with retry strategy
+        # Setup session; retries are handled in _get so the rate controller
+        # sees every 429 and all retries share one budget
         self.session = requests.Session()
-        retry_strategy = Retry(
-            total=5,
-            backoff_factor=2,
-            status_forcelist=[429, 500, 502, 503, 504],
+        adapter = HTTPAdapter(
+            max_retries=0,
+            pool_connections=4,
+            pool_maxsize=self.workers * max(2, self.page_concurrency),
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
         
@@ -124,79 +1062,567 @@ class SimplifiedPixivDownloader:
         # Initialize database
         self.init_database()
         
+    def _get(self, url, stage='request', **kwargs):
+        """Rate-limited GET with adaptive pacing and budgeted retries"""
+        self.retry_budget.deposit()
+        attempt = 1
+        while True:
+            with self.metrics.timer('rate_wait'):
+                self.rate_limiter.wait(url)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.metrics.record(stage, time.perf_counter() - start)
+                self._note_request()
+                self.rate_limiter.record(url)
+                if attempt < MAX_ATTEMPTS and self.retry_budget.withdraw():
+                    attempt += 1
+                    continue
+                raise
+                
+            self.metrics.record(stage, time.perf_counter() - start)
+            self._note_request()
+            # Every outcome feeds the AIMD controller; throttling and 5xx are retried while the budget allows
+            self.rate_limiter.record(url, response.status_code, response.elapsed.total_seconds(),
+                                     response.headers.get('Retry-After'))
+            if (response.status_code in RETRY_STATUSES and attempt < MAX_ATTEMPTS and
+                    self.retry_budget.withdraw()):
+                response.close()
+                attempt += 1
+                continue
+            return response
+        
+    def _bump(self, key, amount=1):
+        """Increment a statistics counter from any worker thread"""
+        with self.lock:
+            self.stats[key] += amount
+            
+    def _reserve_image_slot(self, max_images):
+        """Reserve an image number, or return None if max_images is already covered"""
+        numbers = self._reserve_image_slots(max_images, 1)
+        return numbers[0] if numbers else None
+        
+    def _reserve_image_slots(self, max_images, count):
+        """Reserve up to count consecutive image numbers (fewer when max_images leaves no room), each must be released"""
+        with self.lock:
+            if max_images:
+                count = min(count, max_images - self.stats['downloaded'] - self.in_flight)
+            count = max(count, 0)
+            self.in_flight += count
+            first = self.image_counter
+            self.image_counter += count
+            return list(range(first, first + count))
+            
+    def _release_image_slot(self, success):
+        """Release a reserved slot, counting it as downloaded on success"""
+        with self.lock:
+            self.in_flight -= 1
+            if success:
+                self.stats['downloaded'] += 1
+        if success and self.progress_bar is not None:
+            self.progress_bar.update(1)
+            self._update_postfix()
+            
+    def _note_request(self):
+        """Count a completed request towards the sliding-window request rate"""
+        now = time.monotonic()
+        with self.lock:
+            self.request_times.append(now)
+            while self.request_times[0] < now - REQUEST_RATE_WINDOW:
+                self.request_times.popleft()
+    
+    def _request_rate(self):
+        """Requests per second actually completed over the last REQUEST_RATE_WINDOW seconds"""
+        now = time.monotonic()
+        with self.lock:
+            while self.request_times and self.request_times[0] < now - REQUEST_RATE_WINDOW:
+                self.request_times.popleft()
+            count = len(self.request_times)
+        # Early in a run the window is not full yet, so divide by the time actually covered
+        window = min(REQUEST_RATE_WINDOW, max(now - self.run_started, 1e-3))
+        return count / window
+    
+    def _update_postfix(self):
+        """Show the current request rate (and encode queue) next to the progress bar"""
+        postfix = {'req/s': f"{self._request_rate():.1f}"}
+        if self.transcoder is not None:
+            postfix['encode_queue'] = self.transcoder.depth
+        self.progress_bar.set_postfix(postfix, refresh=False)
+            
+    def _metric_values(self):
+        """Return (counters, gauges) for the metrics export"""
+        with self.lock:
+            counters = {name: value for name, value in self.stats.items()}
+            gauges = {'in_flight': self.in_flight}
+        counters['retries'] = self.retry_budget.spent
+        counters['retries_denied'] = self.retry_budget.denied
+        gauges['elapsed_seconds'] = round(time.monotonic() - self.run_started, 3)
+        gauges['request_rate'] = round(self._request_rate(), 3)
+        gauges['allowed_request_rate'] = round(sum(self.rate_limiter.current_rates().values()), 3)
+        if self.transcoder is not None:
+            gauges['encode_queue_depth'] = self.transcoder.depth
+        return counters, gauges
+        
+    def export_metrics_textfile(self):
+        """Rewrite the Prometheus textfile with the current metrics"""
+        if self.metrics_textfile is None:
+            return
+        counters, gauges = self._metric_values()
+        try:
+            write_file_atomic(self.metrics_textfile, self.metrics.prometheus_text(counters, gauges))
+        except OSError as e:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"⚠️  Could not write metrics to {self.metrics_textfile}: {e}")
+                
+    def _metrics_loop(self):
+        while not self.metrics_stop.wait(self.metrics_interval):
+            self.export_metrics_textfile()
+            
+    def write_metrics_summary(self):
+        """Write the JSON run summary (stage timings, counters, encode stats)"""
+        if self.metrics_json is None:
+            return None
+        counters, gauges = self._metric_values()
+        summary = {
+            'finished_at': datetime.now().isoformat(),
+            'workers': self.workers,
+            'encoders': self.transcoder.encoders if self.transcoder is not None else 0,
+            'stages': self.metrics.summary(),
+            'counters': counters,
+            'gauges': gauges,
+            'request_rates': self.rate_limiter.current_rates(),
+        }
+        if self.transcoder is not None:
+            summary['encode'] = self.transcoder.stats()
+        try:
+            write_file_atomic(self.metrics_json, json.dumps(summary, indent=2))
+        except OSError as e:
+            print(f"⚠️  Could not write metrics summary to {self.metrics_json}: {e}")
+            return None
+        return self.metrics_json
+        
+    def _start_transcoder(self):
+        """Start the PNG encode stage if this run needs one"""
+        if self.transcoder is None and self.storage_mode == STORAGE_PNG and self.encoders != 0:
+            self.transcoder = TranscodeStage(self.encoders, hash_algorithm=self.hash_algorithm,
+                                             metrics=self.metrics)
+        return self.transcoder
+        
+    def _reached_max(self, max_images):
+        with self.lock:
+            return bool(max_images) and self.stats['downloaded'] >= max_images
+        
     def init_database(self):
-        """Initialize SQLite database for tracking downloads"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Open the long-lived SQLite connection and create the downloads table"""
+        # One connection shared by all workers, guarded by db_lock. WAL lets
+        # readers proceed while a batch is being committed.
+        self.db = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=DB_CACHED_STATEMENTS,
+        )
+        self.db_lock = threading.Lock()
+        self.pending_writes = 0
+        self.last_commit = time.monotonic()
         
+        cursor = self.db.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+        
+        cursor.execute(CREATE_DOWNLOADS_SQL)
+        
+        # Migrate databases created before pages were tracked individually
+        migrate_to_page_rows(cursor)
+        
+        # Resumable search position per tag
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS downloads (
-                artwork_id INTEGER PRIMARY KEY,
-                title TEXT,
-                artist_name TEXT,
-                artist_id INTEGER,
-                tags TEXT,
-                file_path TEXT,
-                file_hash TEXT,
-                download_date TEXT,
-                page_count INTEGER DEFAULT 1,
-                bookmark_count INTEGER DEFAULT 0,
-                like_count INTEGER DEFAULT 0,
-                view_count INTEGER DEFAULT 0,
-                width INTEGER,
-                height INTEGER,
-                r18 BOOLEAN DEFAULT FALSE,
-                ai_type INTEGER DEFAULT 0,
-                source_tag TEXT,
-                original_url TEXT,
-                image_number INTEGER
+            CREATE TABLE IF NOT EXISTS tag_progress (
+                tag TEXT PRIMARY KEY,
+                last_completed_page INTEGER DEFAULT 0,
+                last_page INTEGER,
+                updated TEXT
             )
         ''')
+        # Earlier versions logged every artwork ID a search page returned but never read it back
+        cursor.execute('DROP TABLE IF EXISTS tag_seen')
+        
+        # Migrate databases created before source hashes were stored
+        self._add_missing_columns(cursor, 'downloads', {
+            'source_hash': 'TEXT',
+            'hash_algorithm': 'TEXT',
+            'storage_mode': "TEXT DEFAULT 'png'",
+        })
         
         # Create indexes for performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_artist ON downloads(artist_name)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_tags ON downloads(tags)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_date ON downloads(download_date)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_number ON downloads(image_number)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_source_hash ON downloads(source_hash)')
+        
+        # Continue image numbering where the previous run stopped
+        last_number = cursor.execute('SELECT MAX(image_number) FROM downloads').fetchone()[0]
+        self.image_counter = (last_number or 0) + 1
+        
+        # Normalized tag table and full-text index, built from existing rows on first use
+        self.fts_enabled = ensure_tag_index(cursor)
         
-        conn.commit()
-        conn.close()
+        self.db.commit()
+        
+    def _add_missing_columns(self, cursor, table, columns):
+        """Add any of the given columns that an older database is missing"""
+        existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+        
+    def _db_write(self, sql, params=()):
+        """Run a write on the shared connection and commit in batches"""
+        with self.metrics.timer('db_write'), self.db_lock:
+            self.db.execute(sql, params)
+            self.pending_writes += 1
+            # Uncommitted rows are already visible to reads on this connection,
+            # so lookups stay correct while the commit (and its fsync) waits
+            if (self.pending_writes >= DB_BATCH_SIZE or
+                    time.monotonic() - self.last_commit >= DB_BATCH_SECONDS):
+                self._commit_locked()
+                
+    def _db_write_many(self, sql, rows):
+        """Run the same write for many rows, counted as one batch entry per row"""
+        rows = list(rows)
+        if not rows:
+            return
+        with self.metrics.timer('db_write'), self.db_lock:
+            self.db.executemany(sql, rows)
+            self.pending_writes += len(rows)
+            if (self.pending_writes >= DB_BATCH_SIZE or
+                    time.monotonic() - self.last_commit >= DB_BATCH_SECONDS):
+                self._commit_locked()
+                
+    def _commit_locked(self):
+        """Commit pending writes, caller must hold db_lock"""
+        with self.metrics.timer('db_commit'):
+            self.db.commit()
+        self.pending_writes = 0
+        self.last_commit = time.monotonic()
+        
+    def flush_database(self):
+        """Commit any queued writes"""
+        with self.db_lock:
+            if self.pending_writes:
+                self._commit_locked()
+                
+    def close(self):
+        """Stop the encoders, flush queued writes and close the database connection"""
+        if self.transcoder is not None:
+            self.transcoder.shutdown()
+            self.transcoder = None
+        self.flush_database()
+        with self.db_lock:
+            self.db.close()
         
     def is_already_downloaded(self, artwork_id):
-        """Check if artwork is already downloaded"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT file_path, file_hash FROM downloads WHERE artwork_id = ?', (artwork_id,))
-        result = cursor.fetchone()
-        conn.close()
+        """Check if every page of an artwork is already downloaded"""
+        with self.db_lock:
+            rows = self.db.execute(SELECT_PAGES_SQL, (artwork_id,)).fetchall()
+            
+        status = self._page_status(rows).get(int(artwork_id))
+        if status and status['complete']:
+            return True, status['file_path']
+        return False, None
         
-        if result:
-            file_path, file_hash = result
-            # Check if file still exists
-            if os.path.exists(file_path):
-                return True, file_path
-            else:
+    def get_downloaded_pages(self, artwork_id):
+        """Return the page indexes of an artwork that are downloaded and still on disk"""
+        with self.db_lock:
+            rows = self.db.execute(SELECT_PAGES_SQL, (artwork_id,)).fetchall()
+            
+        status = self._page_status(rows).get(int(artwork_id))
+        return status['pages'] if status else set()
+        
+    def _page_status(self, rows):
+        """Group page rows by artwork and check which files still exist, dropping rows whose file is gone"""
+        status = {}
+        missing = []
+        for artwork_id, page_index, page_count, file_path in rows:
+            path = Path(file_path)
+            if path.name not in self._list_directory(path.parent):
                 # File was deleted, remove from database
-                self.remove_from_database(artwork_id)
-                return False, None
-        return False, None
+                missing.append((artwork_id, page_index))
+                continue
+                
+            entry = status.setdefault(artwork_id, {
+                'pages': set(),
+                'page_count': page_count or 1,
+                'file_path': file_path,
+                'files': [],
+            })
+            entry['pages'].add(page_index)
+            entry['files'].append(path)
+            
+        for entry in status.values():
+            entry['complete'] = (LEGACY_PAGE_INDEX in entry['pages'] or
+                                 len(entry['pages']) >= entry['page_count'])
+            
+        self._db_write_many(DELETE_PAGE_SQL, missing)
+        return status
         
     def remove_from_database(self, artwork_id):
-        """Remove entry from database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM downloads WHERE artwork_id = ?', (artwork_id,))
-        conn.commit()
-        conn.close()
-        
-    def calculate_file_hash(self, file_path):
-        """Calculate MD5 hash of file for duplicate detection"""
-        hash_md5 = hashlib.md5()
+        """Remove every page of an artwork (and its tag index entries) from the database"""
+        self._db_write(DELETE_DOWNLOAD_SQL, (artwork_id,))
+        self._db_write(DELETE_ARTWORK_TAGS_SQL, (artwork_id,))
+        if self.fts_enabled:
+            self._db_write(DELETE_DOWNLOADS_FTS_SQL, (artwork_id,))
+        
+    def _list_directory(self, directory):
+        """Return the file names in a directory, scanned once per run"""
+        key = str(directory)
+        with self.lock:
+            names = self.dir_listings.get(key)
+        if names is not None:
+            return names
+            
+        try:
+            with os.scandir(directory) as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            names = set()
+            
+        with self.lock:
+            # Another worker may have scanned it meanwhile, keep the first copy
+            return self.dir_listings.setdefault(key, names)
+            
+    def _remember_file(self, file_path):
+        """Record a newly written file in the cached directory listing"""
+        file_path = Path(file_path)
+        with self.lock:
+            names = self.dir_listings.get(str(file_path.parent))
+            if names is not None:
+                names.add(file_path.name)
+                
+    def get_downloaded_ids(self, artwork_ids):
+        """Return the IDs (as strings) of artworks fully downloaded and still on disk"""
+        return set(self.get_download_status(artwork_ids))
+        
+    def get_download_status(self, artwork_ids):
+        """Return {artwork_id (str): page status} for artworks fully downloaded and still on disk"""
+        ids = []
+        for artwork_id in artwork_ids:
+            try:
+                ids.append(int(artwork_id))
+            except (TypeError, ValueError):
+                continue
+        if not ids:
+            return {}
+            
+        # One IN (...) query per chunk instead of one query per artwork
+        rows = []
+        with self.metrics.timer('db_lookup'), self.db_lock:
+            for start in range(0, len(ids), DB_LOOKUP_CHUNK):
+                chunk = ids[start:start + DB_LOOKUP_CHUNK]
+                sql = SELECT_PAGES_IN_SQL.format(','.join('?' * len(chunk)))
+                rows.extend(self.db.execute(sql, chunk).fetchall())
+                
+        # Partially downloaded works are left for download_artwork to resume
+        return {str(artwork_id): entry for artwork_id, entry in self._page_status(rows).items()
+                if entry['complete']}
+                
+    def _link_known_artworks(self, known, tag):
+        """Make artworks downloaded under other tags visible in this tag's folder"""
+        tag_dir = self.download_dir / self.sanitize_filename(tag)
+        manifest_entries = []
+        
+        for artwork_id, entry in known.items():
+            for source in entry['files']:
+                if source.parent == tag_dir:
+                    continue
+                    
+                # Hardlinks take no extra disk space, otherwise the path goes into the manifest
+                target = tag_dir / source.name
+                if self.link_mode == LINK_HARDLINK:
+                    try:
+                        tag_dir.mkdir(parents=True, exist_ok=True)
+                        if target.exists():
+                            if os.path.samefile(source, target):
+                                continue
+                            target = tag_dir / f"{artwork_id}_{source.name}"
+                            if target.exists():
+                                continue
+                        os.link(source, target)
+                        self._remember_file(target)
+                        self._bump('linked')
+                        continue
+                    except OSError:
+                        # Different drive or filesystem without hardlinks
+                        pass
+                manifest_entries.append(source)
+                
+        if manifest_entries:
+            tag_dir.mkdir(parents=True, exist_ok=True)
+            manifest_path = tag_dir / MANIFEST_NAME
+            listed = set()
+            if manifest_path.exists():
+                listed = set(manifest_path.read_text(encoding='utf-8').splitlines())
+            new_entries = [str(source) for source in manifest_entries if str(source) not in listed]
+            with open(manifest_path, 'a', encoding='utf-8') as f:
+                for source in new_entries:
+                    f.write(f"{source}\n")
+            self._bump('linked', len(new_entries))
+        
+    def reconcile(self, dry_run=False):
+        """Bring the downloads table in line with what is actually on disk, returns a dict of counts"""
+        start = time.perf_counter()
+        self.flush_database()
+        on_disk = scan_image_tree(self.download_dir)
+        with self.db_lock:
+            rows = self.db.execute(SELECT_RECONCILE_SQL).fetchall()
+            
+        # Rows whose path still exists need nothing else
+        tracked = set()
+        missing = []
+        for row in rows:
+            key = path_key(row[2])
+            if key in on_disk:
+                tracked.add(key)
+            else:
+                missing.append(row)
+        untracked = [path for key, path in on_disk.items() if key not in tracked]
+        by_name = {}
+        for path in untracked:
+            by_name.setdefault(os.path.basename(path), []).append(path)
+            
+        hashes = {}
+        def file_hash(path, algorithm):
+            if (path, algorithm) not in hashes:
+                hashes[path, algorithm] = self.calculate_file_hash(path, algorithm)
+            return hashes[path, algorithm]
+            
+        # Moved files keep their name
+        moved = []
+        unresolved = []
+        for artwork_id, page_index, file_path, stored_hash, algorithm in missing:
+            algorithm = algorithm or LEGACY_HASH_ALGORITHM
+            match = None
+            if stored_hash:
+                for candidate in by_name.get(os.path.basename(file_path or ''), []):
+                    if file_hash(candidate, algorithm) == stored_hash:
+                        match = candidate
+                        break
+            if match:
+                moved.append((match, artwork_id, page_index))
+            else:
+                unresolved.append((artwork_id, page_index, stored_hash, algorithm))
+                
+        # Renamed files: compare against every untracked file, hashed once per algorithm
+        by_hash = {}
+        orphans = []
+        for artwork_id, page_index, stored_hash, algorithm in unresolved:
+            if stored_hash and algorithm not in by_hash:
+                by_hash[algorithm] = {file_hash(path, algorithm): path for path in untracked}
+            match = by_hash[algorithm].get(stored_hash) if stored_hash else None
+            if match:
+                moved.append((match, artwork_id, page_index))
+            else:
+                orphans.append((artwork_id, page_index))
+                
+        # Re-point moved rows and purge the rest with their tag index entries in one transaction
+        if not dry_run and (moved or orphans):
+            with self.db_lock:
+                try:
+                    self.db.executemany(UPDATE_FILE_PATH_SQL, moved)
+                    self.db.executemany(DELETE_PAGE_SQL, orphans)
+                    self.db.execute(PURGE_ARTWORK_TAGS_SQL)
+                    if self.fts_enabled:
+                        self.db.execute(PURGE_DOWNLOADS_FTS_SQL)
+                    self.db.commit()
+                except sqlite3.Error:
+                    self.db.rollback()
+                    raise
+            self.dir_listings.clear()
+            
+        moved_paths = {path_key(path) for path, _, _ in moved}
+        result = {
+            'files_on_disk': len(on_disk),
+            'rows': len(rows),
+            'ok': len(rows) - len(missing),
+            'moved': len(moved),
+            'purged': len(orphans),
+            'untracked': sum(1 for path in untracked if path_key(path) not in moved_paths),
+            'seconds': time.perf_counter() - start,
+        }
+        
+        action = "Would fix" if dry_run else "Fixed"
+        print(f"🧾 Reconciled {result['rows']} rows against {result['files_on_disk']} files "
+              f"in {result['seconds']:.2f}s")
+        print(f"   ✅ In place: {result['ok']}")
+        print(f"   📦 {action} moved: {result['moved']}")
+        print(f"   🗑️  {'Would purge' if dry_run else 'Purged'} missing: {result['purged']}")
+        print(f"   ❔ Files not in the database: {result['untracked']}")
+        return result
+        
+    def get_resume_page(self, tag):
+        """Return the search page a run for this tag should start from"""
+        with self.db_lock:
+            row = self.db.execute(SELECT_TAG_PROGRESS_SQL, (tag,)).fetchone()
+        if not row:
+            return 1
+            
+        last_completed_page, last_page = row
+        if last_page is not None and last_completed_page >= last_page:
+            # Every page was done before, start over to pick up new uploads
+            return 1
+        return last_completed_page + 1
+        
+    def save_tag_progress(self, tag, last_completed_page, last_page=None):
+        """Persist the last fully processed search page of a tag"""
+        self._db_write(SAVE_TAG_PROGRESS_SQL, (tag, last_completed_page, last_page,
+                                               datetime.now().isoformat()))
+        
+    def _search_cache_path(self, tag, page):
+        key = hashlib.sha1(f"{tag}\0{page}".encode('utf-8')).hexdigest()
+        return self.search_cache_dir / f"{key}.json"
+        
+    def _read_search_cache(self, tag, page):
+        """Return a cached search body younger than the TTL, or None"""
+        if not self.search_cache_ttl:
+            return None
+        cache_path = self._search_cache_path(tag, page)
+        try:
+            if time.time() - cache_path.stat().st_mtime > self.search_cache_ttl:
+                return None
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+            
+    def _write_search_cache(self, tag, page, body):
+        if not self.search_cache_ttl:
+            return
+        cache_path = self._search_cache_path(tag, page)
+        try:
+            self.search_cache_dir.mkdir(parents=True, exist_ok=True)
+            # Write to a temp file first so a crash never leaves half a cache entry
+            temp_path = cache_path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(body, f)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"⚠️  Could not cache search page {page}: {e}")
+        
+    def new_hasher(self):
+        """Create a hash object for the configured algorithm"""
+        return hashlib.new(self.hash_algorithm)
+        
+    def calculate_file_hash(self, file_path, algorithm=None):
+        """Calculate the hash of a file on disk for duplicate detection (downloads are hashed in flight)"""
+        # reconcile passes the algorithm a moved file's row was hashed with
+        hasher = hashlib.new(algorithm) if algorithm else self.new_hasher()
         try:
             with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+                for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+            return hasher.hexdigest()
         except Exception as e:
             if self.progress_bar is not None:
                 self.progress_bar.write(f"Error calculating hash for {file_path}: {e}")
@@ -204,6 +1630,13 @@ class SimplifiedPixivDownloader:
             
     def search_artworks(self, tag, page=1):
         """Search for artworks by tag - ALWAYS get all content"""
+        # Served from the on-disk cache while younger than search_cache_ttl
+        cached = self._read_search_cache(tag, page)
+        if cached is not None:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"💾 Using cached search page {page} for '{tag}'")
+            return cached
+            
         # URL encode the tag
         encoded_tag = quote(tag)
         url = f'https://www.pixiv.net/ajax/search/artworks/{encoded_tag}'
@@ -222,7 +1655,7 @@ class SimplifiedPixivDownloader:
         try:
             if self.progress_bar is not None:
                 self.progress_bar.write(f"🔍 Searching page {page} for '{tag}'...")
-            response = self.session.get(url, params=params, timeout=30)
+            response = self._get(url, stage='search', params=params, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -231,7 +1664,9 @@ class SimplifiedPixivDownloader:
                     self.progress_bar.write(f"❌ API Error: {data.get('message', 'Unknown error')}")
                 return None
                 
-            return data.get('body', {})
+            body = data.get('body', {})
+            self._write_search_cache(tag, page, body)
+            return body
         except requests.exceptions.RequestException as e:
             if self.progress_bar is not None:
                 self.progress_bar.write(f"❌ Request failed: {e}")
@@ -246,7 +1681,7 @@ class SimplifiedPixivDownloader:
         url = f'https://www.pixiv.net/ajax/illust/{artwork_id}'
         
         try:
-            response = self.session.get(url, timeout=30)
+            response = self._get(url, stage='details', timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -266,7 +1701,7 @@ class SimplifiedPixivDownloader:
         url = f'https://www.pixiv.net/ajax/illust/{artwork_id}/pages'
         
         try:
-            response = self.session.get(url, timeout=30)
+            response = self._get(url, stage='pages', timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -281,6 +1716,81 @@ class SimplifiedPixivDownloader:
                 self.progress_bar.write(f"❌ Failed to get artwork pages for {artwork_id}: {e}")
             return None
             
+    def get_user_artwork_ids(self, user_id, include_manga=True):
+        """Return every work ID of a user, newest first, from a single profile call"""
+        url = f'https://www.pixiv.net/ajax/user/{user_id}/profile/all'
+        
+        try:
+            response = self._get(url, stage='profile', params={'lang': 'en'}, timeout=30)
+            response.raise_for_status()
+            
+            data = response.json()
+            if data.get('error'):
+                if self.progress_bar is not None:
+                    self.progress_bar.write(f"❌ Error getting profile of {user_id}: {data.get('message', 'Unknown error')}")
+                return None
+                
+            # Each category is a {id: null} object, or [] when the user has none
+            body = data.get('body', {})
+            artwork_ids = set(body.get('illusts') or {})
+            if include_manga:
+                artwork_ids.update(body.get('manga') or {})
+            return sorted(artwork_ids, key=int, reverse=True)
+        except requests.exceptions.RequestException as e:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"❌ Failed to get profile of {user_id}: {e}")
+            return None
+            
+    def get_user_artworks(self, user_id, artwork_ids):
+        """Get search-style metadata (thumbnail URL, page count, size...) for up to USER_WORKS_BATCH works"""
+        url = f'https://www.pixiv.net/ajax/user/{user_id}/profile/illusts'
+        params = [('ids[]', artwork_id) for artwork_id in artwork_ids]
+        params += [('work_category', 'illustManga'), ('is_first_page', 0), ('lang', 'en')]
+        
+        try:
+            response = self._get(url, stage='user_works', params=params, timeout=30)
+            response.raise_for_status()
+            
+            data = response.json()
+            if data.get('error'):
+                if self.progress_bar is not None:
+                    self.progress_bar.write(f"❌ Error getting works of {user_id}: {data.get('message', 'Unknown error')}")
+                return None
+                
+            works = data.get('body', {}).get('works') or {}
+            return [works[artwork_id] for artwork_id in artwork_ids if artwork_id in works]
+        except requests.exceptions.RequestException as e:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"❌ Failed to get works of {user_id}: {e}")
+            return None
+            
+    def get_bookmarks_page(self, user_id, offset=0, private=False):
+        """Get one page of a user's bookmarks, returns the body with 'works' and 'total'"""
+        url = f'https://www.pixiv.net/ajax/user/{user_id}/illusts/bookmarks'
+        params = {
+            'tag': '',
+            'offset': offset,
+            'limit': BOOKMARKS_PAGE_SIZE,
+            'rest': 'hide' if private else 'show',
+            'lang': 'en',
+        }
+        
+        try:
+            response = self._get(url, stage='bookmarks', params=params, timeout=30)
+            response.raise_for_status()
+            
+            data = response.json()
+            if data.get('error'):
+                if self.progress_bar is not None:
+                    self.progress_bar.write(f"❌ Error getting bookmarks of {user_id}: {data.get('message', 'Unknown error')}")
+                return None
+                
+            return data.get('body', {})
+        except requests.exceptions.RequestException as e:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"❌ Failed to get bookmarks of {user_id}: {e}")
+            return None
+            
     def sanitize_filename(self, filename, max_length=100):
         """Sanitize filename for filesystem with proper Unicode handling"""
         # Remove or replace invalid characters
@@ -312,97 +1822,222 @@ class SimplifiedPixivDownloader:
         return filename or f"artwork_{int(time.time())}"
         
     def convert_to_png_fast(self, image_data, output_path):
-        """Convert any image format to PNG with SPEED OPTIMIZATION"""
+        """Convert any image format (bytes or a file path) to PNG with SPEED OPTIMIZATION, returns the PNG hash or None"""
         try:
-            # Open image from bytes
-            img = Image.open(io.BytesIO(image_data))
-            
-            # SPEED OPTIMIZATION: Skip unnecessary conversions for already RGB/RGBA images
-            if img.mode == 'RGB':
-                # Already RGB, just save directly
-                pass
-            elif img.mode == 'RGBA':
-                # Already RGBA, just save directly  
-                pass
-            elif img.mode == 'P':
-                # Palette mode - convert to RGBA to preserve transparency
-                img = img.convert('RGBA')
-            elif img.mode == 'LA':
-                # Grayscale with alpha - convert to RGBA
-                img = img.convert('RGBA')
-            else:
-                # Other modes - convert to RGB (fastest)
-                img = img.convert('RGB')
-            
-            # SPEED OPTIMIZATION: Use fast PNG save settings
-            img.save(output_path, 'PNG', 
-                    optimize=False,  # Disable optimization for speed
-                    compress_level=1)  # Fastest compression (1-9, 1 is fastest)
-            
-            self.stats['converted'] += 1
-            return True
+            file_hash, timings = transcode_to_png(image_data, output_path, self.hash_algorithm)
+            self.metrics.record_many(timings)
+            self._bump('converted')
+            return file_hash
         except Exception as e:
             if self.progress_bar is not None:
                 self.progress_bar.write(f"❌ Failed to convert image to PNG: {e}")
-            return False
+            return None
+            
+    def save_original(self, spool, output_path):
+        """Store the downloaded bytes untouched, named by their real format, returns the path or None when unrecognised"""
+        extension = detect_image_extension(spool.head(16))
+        if extension is None:
+            return None
+        output_path = output_path.with_suffix(extension)
+        with self.metrics.timer('original_write', spool.size):
+            spool.save_to(output_path)
+        self._bump('kept_original')
+        return output_path
+        
+    def find_by_source_hash(self, source_hash):
+        """Return (file_path, file_hash, storage_mode) of an existing download with identical source bytes"""
+        with self.db_lock:
+            result = self.db.execute(SELECT_SOURCE_HASH_SQL, (source_hash, self.hash_algorithm)).fetchone()
+        if result:
+            path = Path(result[0])
+            if path.name in self._list_directory(path.parent):
+                return result
+        return None
             
-    def download_and_convert_image(self, url, output_path, referer_id, artist_name):
-        """Download image and convert to PNG with numbered filename - OPTIMIZED"""
+    def fetch_to_spool(self, url, referer_id, quiet_missing=False):
+        """Stream an image into a DownloadSpool while hashing it, returns (spool, source_hash) or None on failure"""
         headers = {
             'Referer': f'https://www.pixiv.net/artworks/{referer_id}',
             'User-Agent': self.session.headers['User-Agent'],
             'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
+            'Accept-Encoding': 'identity',  # byte ranges must refer to the raw file
             'Accept-Language': 'en-US,en;q=0.9,ja;q=0.8',
         }
         
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.session.get(url, headers=headers, timeout=60, stream=True)
-                response.raise_for_status()
-                
-                # SPEED OPTIMIZATION: Read image data more efficiently
-                image_data = response.content  # Get all content at once instead of chunking
-                
-                # Create directory if it doesn't exist
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Convert to PNG and save with fast method
-                if self.convert_to_png_fast(image_data, output_path):
-                    if self.progress_bar is not None:
-                        self.progress_bar.write(f"✅ Downloaded & converted: {output_path.name}")
-                    return True
-                else:
-                    return False
+        spool = DownloadSpool(self.spool_memory_limit, self.spool_dir)
+        source_hasher = self.new_hasher()
+        transfer_start = time.perf_counter()
+        hash_seconds = 0.0
+        max_retries = MAX_ATTEMPTS
+        try:
+            for attempt in range(max_retries):
+                request_headers = dict(headers)
+                # A transfer that broke part-way continues where it stopped
+                if spool.size:
+                    request_headers['Range'] = f'bytes={spool.size}-'
+                try:
+                    response = self._get(url, stage='image_response', headers=request_headers,
+                                         timeout=60, stream=True)
+                    response.raise_for_status()
                     
-            except requests.exceptions.RequestException as e:
-                if self.progress_bar is not None:
-                    self.progress_bar.write(f"❌ Attempt {attempt + 1} failed for {url}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    return False
+                    if spool.size and response.status_code != 206:
+                        # Server ignored the range, start the file over
+                        spool.reset()
+                        source_hasher = self.new_hasher()
+                        hash_seconds = 0.0
+                    elif spool.size:
+                        self._bump('resumed_transfers')
+                        
+                    # Abort before transferring anything if the size is already known to be too big
+                    expected_size = content_total_size(response, spool.size)
+                    if self.max_image_bytes and expected_size and expected_size > self.max_image_bytes:
+                        response.close()
+                        self._report_oversized(url, expected_size)
+                        return None
+                        
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        spool.write(chunk)
+                        hash_start = time.perf_counter()
+                        source_hasher.update(chunk)
+                        hash_seconds += time.perf_counter() - hash_start
+                        self._bump('bytes_downloaded', len(chunk))
+                        if self.max_image_bytes and spool.size > self.max_image_bytes:
+                            response.close()
+                            self._report_oversized(url, spool.size)
+                            return None
+                            
+                    result = (spool, source_hasher.hexdigest())
+                    self.metrics.record('transfer', time.perf_counter() - transfer_start, spool.size)
+                    self.metrics.record('source_hash', hash_seconds, spool.size)
+                    spool = None  # ownership passes to the caller, which must discard() it
+                    return result
                     
-        return False
+                except requests.exceptions.RequestException as e:
+                    # The file does not exist, retrying will not change that
+                    missing = getattr(e.response, 'status_code', None) == 404
+                    # Callers probing guessed URLs need a wrong guess told apart from a failed download
+                    if missing and quiet_missing:
+                        raise ImageMissing(url) from None
+                    if self.progress_bar is not None:
+                        self.progress_bar.write(f"❌ Attempt {attempt + 1} failed for {url}: {e}")
+                    # Status errors were already retried by _get, only a broken
+                    # transfer is worth another attempt, paid from the shared budget
+                    if missing or isinstance(e, requests.exceptions.HTTPError):
+                        return None
+                    if attempt < max_retries - 1 and self.retry_budget.withdraw():
+                        if spool.size and self.progress_bar is not None:
+                            self.progress_bar.write(f"↪️  Resuming {url.rsplit('/', 1)[-1]} at {spool.size} bytes")
+                        continue
+                    return None
+                    
+            return None
+        finally:
+            if spool is not None:
+                spool.discard()
+                
+    def _report_oversized(self, url, size):
+        self._bump('oversized')
+        if self.progress_bar is not None:
+            self.progress_bar.write(f"⏭️  Skipping {url.rsplit('/', 1)[-1]}: {size / (1024 * 1024):.1f} MB "
+                                    f"exceeds the {self.max_image_bytes / (1024 * 1024):.1f} MB limit")
         
-    def save_to_database(self, artwork_data, file_path, file_hash, source_tag, image_number):
-        """Save download information to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def download_and_convert_image(self, url, output_path, referer_id, artist_name, quiet_missing=False,
+                                   on_encoded=None):
+        """Download image and convert to PNG - OPTIMIZED, returns a dict describing the stored file or None on failure"""
+        fetched = self.fetch_to_spool(url, referer_id, quiet_missing)
+        if fetched is None:
+            return None
+        spool, source_hash = fetched
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO downloads 
-            (artwork_id, title, artist_name, artist_id, tags, file_path, file_hash, 
-             download_date, page_count, bookmark_count, like_count, view_count,
-             width, height, r18, ai_type, source_tag, original_url, image_number)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        try:
+            # Exact duplicate of something we already have - skip the encode and point at the existing file
+            duplicate = self.find_by_source_hash(source_hash)
+            if duplicate:
+                self._bump('duplicates')
+                if self.progress_bar is not None:
+                    self.progress_bar.write(f"♻️  Duplicate of {Path(duplicate[0]).name}, not saved again")
+                return {
+                    'file_path': Path(duplicate[0]),
+                    'file_hash': duplicate[1],
+                    'source_hash': source_hash,
+                    'source_url': url,
+                    'storage_mode': duplicate[2] or STORAGE_PNG,
+                    'duplicate': True,
+                }
+            
+            # Create directory if it doesn't exist
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Keep-original mode: zero decode, unknown formats fall back to PNG
+            if self.storage_mode == STORAGE_ORIGINAL:
+                saved_path = self.save_original(spool, output_path)
+                if saved_path is not None:
+                    if self.progress_bar is not None:
+                        self.progress_bar.write(f"✅ Downloaded: {saved_path.name}")
+                    # Nothing was re-encoded, so the output hash is the source hash
+                    return {
+                        'file_path': saved_path,
+                        'file_hash': source_hash,
+                        'source_hash': source_hash,
+                        'source_url': url,
+                        'storage_mode': STORAGE_ORIGINAL,
+                        'duplicate': False,
+                    }
+            
+            # Hand the data to the encoder processes and keep fetching. The PNG hash
+            # is not known yet: on_encoded(result, future) gets it from the future
+            # once the file is written, and the spool is discarded after that
+            if self.transcoder is not None:
+                result = {
+                    'file_path': output_path,
+                    'file_hash': None,
+                    'source_hash': source_hash,
+                    'source_url': url,
+                    'storage_mode': STORAGE_PNG,
+                    'duplicate': False,
+                }
+                
+                def encoded(future, spool=spool):
+                    try:
+                        if on_encoded is not None:
+                            on_encoded(result, future)
+                    finally:
+                        spool.discard()
+                        
+                result['pending'] = self.transcoder.submit(spool.source(), output_path, spool.size, on_done=encoded)
+                spool = None
+                return result
+            
+            # Convert to PNG and save with fast method
+            file_hash = self.convert_to_png_fast(spool.source(), output_path)
+            if file_hash:
+                if self.progress_bar is not None:
+                    self.progress_bar.write(f"✅ Downloaded & converted: {output_path.name}")
+                return {
+                    'file_path': output_path,
+                    'file_hash': file_hash,
+                    'source_hash': source_hash,
+                    'source_url': url,
+                    'storage_mode': STORAGE_PNG,
+                    'duplicate': False,
+                }
+            else:
+                return None
+        finally:
+            if spool is not None:
+                spool.discard()
+        
+    def save_to_database(self, artwork_data, file_path, file_hash, source_tag, image_number,
+                         source_hash=None, storage_mode=STORAGE_PNG, page_index=0, source_url=None):
+        """Save download information to database, keeping the tag index in step"""
+        tags = extract_tags(artwork_data)
+        self._db_write(INSERT_DOWNLOAD_SQL, (
             artwork_data['id'],
+            page_index,
             artwork_data.get('title', 'Unknown'),
             artwork_data.get('userName', 'Unknown'),
             artwork_data.get('userId', 0),
-            ','.join([str(tag) for tag in artwork_data.get('tags', [])]),
+            ','.join(tags),
             str(file_path),
             file_hash,
             datetime.now().isoformat(),
@@ -415,127 +2050,472 @@ class SimplifiedPixivDownloader:
             artwork_data.get('xRestrict', 0) > 0,
             artwork_data.get('aiType', 0),
             source_tag,
-            artwork_data.get('url', ''),
-            image_number
+            source_url or artwork_data.get('url', ''),  # the image actually downloaded, not the thumbnail
+            image_number,
+            source_hash,
+            self.hash_algorithm,
+            storage_mode
         ))
+        self._db_write_many(INSERT_ARTWORK_TAG_SQL, ((artwork_data['id'], tag) for tag in tags))
+        if self.fts_enabled:
+            self._db_write(UPSERT_DOWNLOADS_FTS_SQL, (artwork_data['id'], artwork_data.get('title', ''), ' '.join(tags)))
+        self._remember_file(file_path)
+        
+    def _record_image(self, details, result, source_tag, image_number, page_index=0):
+        """Save a finished image to the database and release its slot"""
+        # Images still being encoded are recorded by the _encoded_recorder callback
+        if result.get('pending') is not None:
+            return
+        try:
+            self.save_to_database(details, result['file_path'], result['file_hash'],
+                                  source_tag, image_number, result['source_hash'],
+                                  result['storage_mode'], page_index, result['source_url'])
+        finally:
+            self._release_image_slot(not result['duplicate'])
+            
+    def _encoded_recorder(self, details, source_tag, image_number, page_index=0):
+        """Build the on_encoded callback that records an image once the encoder is done"""
+        # Runs inside the encode stage's completion step, so drain() only
+        # returns after the row is written and the slot released
+        def finish(result, future):
+            saved = False
+            try:
+                file_hash, _ = future.result()
+                self._bump('converted')
+                self.save_to_database(details, result['file_path'], file_hash,
+                                      source_tag, image_number, result['source_hash'],
+                                      result['storage_mode'], page_index, result['source_url'])
+                if self.progress_bar is not None:
+                    self.progress_bar.write(f"✅ Downloaded & converted: {result['file_path'].name}")
+                saved = True
+            except Exception as e:
+                if self.progress_bar is not None:
+                    self.progress_bar.write(f"❌ Failed to convert image to PNG: {e}")
+                self._bump('failed')
+            finally:
+                self._release_image_slot(saved)
+                
+        return finish
+        
+    def _filtered_out(self, artwork_data):
+        """Apply the artwork filter, counting the reason of a skip"""
+        reason = self.artwork_filter.check(artwork_data)
+        if reason is None:
+            return False
+        self._bump(f'filtered_{reason}')
+        return True
+        
+    def _artwork_target(self, metadata, source_tag):
+        """Return (tag_dir, safe_artist) for an artwork, creating the tag directory"""
+        # Create safe artist name
+        safe_artist = self.sanitize_filename(metadata.get('userName', 'Unknown_Artist'))
         
-        conn.commit()
-        conn.close()
+        # Create tag directory: PixivImages/TopicName/
+        tag_dir = self.download_dir / self.sanitize_filename(source_tag)
+        tag_dir.mkdir(parents=True, exist_ok=True)
+        return tag_dir, safe_artist
+        
+    def _download_single(self, metadata, image_urls, source_tag, max_images, probe=False):
+        """Download a single-page artwork from the first URL that works, returns True when done, False without a slot, None when failed"""
+        artwork_id = metadata['id']
+        tag_dir, safe_artist = self._artwork_target(metadata, source_tag)
+        
+        # Single image - reserve its number before downloading so workers never collide
+        image_number = self._reserve_image_slot(max_images)
+        if image_number is None:
+            return False
+            
+        handed_off = False
+        missing = 0
+        try:
+            file_path = tag_dir / output_filename(artwork_id, 0, safe_artist)
+            
+            for image_url in image_urls:
+                try:
+                    result = self.download_and_convert_image(
+                        image_url, file_path, artwork_id, safe_artist, quiet_missing=probe,
+                        on_encoded=self._encoded_recorder(metadata, source_tag, image_number))
+                except ImageMissing:
+                    # With probe=True the URLs are guesses, a 404 moves on to the next one
+                    missing += 1
+                    continue
+                if result:
+                    handed_off = True
+                    self._record_image(metadata, result, source_tag, image_number)
+                    return True
+                # The URL exists but the download failed (network, decode, size
+                # limit); the remaining guesses would only 404
+                if probe:
+                    break
+                    
+            if probe and missing == len(image_urls):
+                raise ImageMissing(artwork_id)
+                
+        except ImageMissing:
+            raise
+        except Exception as e:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"❌ Error downloading single image {artwork_id}: {e}")
+        finally:
+            if not handed_off:
+                self._release_image_slot(False)
+        return None
         
-    def download_artwork(self, artwork_data, source_tag, max_images=None):
-        """Download a single artwork with new numbering system"""
+    def download_artwork(self, artwork_data, source_tag, max_images=None, known_new=False):
+        """Download a single artwork, returns True when done, False when failed, None when not (fully) tried"""
+        # known_new: the caller already filtered the artwork with get_downloaded_ids
         artwork_id = artwork_data['id']
         
+        # Stop early if the run was interrupted
+        if self.stop_event.is_set():
+            return None
+        
         # Check if already downloaded
-        is_downloaded, existing_path = self.is_already_downloaded(artwork_id)
-        if is_downloaded:
-            self.stats['skipped'] += 1
-            return True
+        if not known_new:
+            is_downloaded, existing_path = self.is_already_downloaded(artwork_id)
+            if is_downloaded:
+                self._bump('skipped')
+                return True
             
         # Check if we've reached max images
-        if max_images and self.stats['downloaded'] >= max_images:
-            return False
+        if self._reached_max(max_images):
+            return None
+            
+        # Drop unwanted works on the metadata we already have
+        if self._filtered_out(artwork_data):
+            return True
+        needs_details = self.artwork_filter.needs_details(artwork_data)
+            
+        # Fast path: no details call for single-page works found through search;
+        # the details endpoint is only called if every derived URL 404s
+        if (artwork_data.get('pageCount') == 1 and artwork_data.get('illustType') != ILLUST_TYPE_UGOIRA and
+                not needs_details):
+            candidates = derive_original_urls(artwork_data.get('url'))
+            if candidates:
+                try:
+                    outcome = self._download_single(artwork_data, candidates, source_tag, max_images, probe=True)
+                except ImageMissing:
+                    # Only a wrong guess is worth the details call
+                    self._bump('derived_url_misses')
+                else:
+                    if outcome is None:
+                        self._bump('failed')
+                        return False
+                    if not outcome:
+                        return None  # no slot left under max_images
+                    self._bump('details_skipped')
+                    return True
             
         # Get detailed artwork information
         details = self.get_artwork_details(artwork_id)
         if not details:
-            self.stats['failed'] += 1
+            self._bump('failed')
             return False
             
-        title = details.get('title', f'Artwork_{artwork_id}')
-        artist_name = details.get('userName', 'Unknown_Artist')
+        # Bookmark counts only come with the details
+        if needs_details and self._filtered_out(details):
+            return True
+            
         page_count = details.get('pageCount', 1)
         
-        # Create safe artist name
-        safe_artist = self.sanitize_filename(artist_name)
-        
-        # Create tag directory: PixivImages/TopicName/
-        tag_dir = self.download_dir / self.sanitize_filename(source_tag)
-        tag_dir.mkdir(parents=True, exist_ok=True)
-        
-        success = False
-        
         if page_count == 1:
-            # Single image
-            try:
-                image_url = details['urls']['original']
-                filename = f"{self.image_counter}_{safe_artist}.png"
-                file_path = tag_dir / filename
-                
-                if self.download_and_convert_image(image_url, file_path, artwork_id, safe_artist):
-                    file_hash = self.calculate_file_hash(file_path)
-                    self.save_to_database(details, file_path, file_hash, source_tag, self.image_counter)
-                    self.stats['downloaded'] += 1
-                    if self.progress_bar is not None:
-                        self.progress_bar.update(1)
-                    self.image_counter += 1
-                    success = True
-                else:
-                    self.stats['failed'] += 1
-                    
-            except Exception as e:
-                if self.progress_bar is not None:
-                    self.progress_bar.write(f"❌ Error downloading single image {artwork_id}: {e}")
-                self.stats['failed'] += 1
+            outcome = self._download_single(details, [details['urls']['original']], source_tag, max_images)
+            if outcome is None:
+                self._bump('failed')
+                return False
+            return True if outcome else None
+            
+        # Multiple images (manga)
+        tag_dir, safe_artist = self._artwork_target(details, source_tag)
+        pages = self.get_artwork_pages(artwork_id)
+        if not pages:
+            self._bump('failed')
+            return False
+            
+        # Resume: only fetch the pages that are not on disk yet
+        done_pages = self.get_downloaded_pages(artwork_id)
+        if done_pages:
+            self._bump('pages_skipped', len(done_pages))
+            
+        # Reserve a number for every remaining page up front, in page order,
+        # so numbering does not depend on which page finishes first
+        todo = [(i, page) for i, page in enumerate(pages) if i not in done_pages]
+        numbers = self._reserve_image_slots(max_images, len(todo))
+        if 0 < len(numbers) < len(todo) and self.progress_bar is not None:
+            self.progress_bar.write(f"🎯 Only {len(numbers)} of {len(todo)} remaining pages of {artwork_id} "
+                                    f"fit under max_images")
+        jobs = list(zip(todo, numbers))
+        if todo and not jobs:
+            return None
+            
+        # Fetch the pages concurrently, at most page_concurrency per artwork
+        success_count = 0
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(self.page_concurrency, len(jobs)),
+                                    thread_name_prefix="pixiv-page") as page_pool:
+                outcomes = page_pool.map(
+                    lambda job: self._download_page(details, job[0][1], job[0][0], job[1],
+                                                    tag_dir, safe_artist, source_tag),
+                    jobs)
+                success_count = sum(1 for outcome in outcomes if outcome)
                 
-        else:
-            # Multiple images (manga)
-            pages = self.get_artwork_pages(artwork_id)
-            if not pages:
-                self.stats['failed'] += 1
+        if len(jobs) < len(todo):
+            return None  # the remaining pages are fetched by a later run
+        if success_count == len(jobs):
+            return True
+        if success_count > 0:
+            # Partly saved: the failed pages are retried when the search page is walked again
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"⚠️  {len(jobs) - success_count} of {len(jobs)} pages of {artwork_id} failed")
+            return False
+        self._bump('failed')
+        return False
+        
+    def _download_page(self, details, page, page_index, image_number, tag_dir, safe_artist, source_tag):
+        """Download one page of a multi-page work under its reserved image number"""
+        artwork_id = details['id']
+        handed_off = False
+        try:
+            if self.stop_event.is_set():
                 return False
+            file_path = tag_dir / output_filename(artwork_id, page_index, safe_artist)
+            
+            result = self.download_and_convert_image(
+                page['urls']['original'], file_path, artwork_id, safe_artist,
+                on_encoded=self._encoded_recorder(details, source_tag, image_number, page_index))
+            if result:
+                handed_off = True
+                self._record_image(details, result, source_tag, image_number, page_index)
+                return True
                 
-            success_count = 0
-            for i, page in enumerate(pages):
-                # Check if we've reached max images
-                if max_images and self.stats['downloaded'] >= max_images:
-                    break
-                    
-                try:
-                    image_url = page['urls']['original']
-                    filename = f"{self.image_counter}_{safe_artist}.png"
-                    file_path = tag_dir / filename
-                    
-                    if self.download_and_convert_image(image_url, file_path, artwork_id, safe_artist):
-                        file_hash = self.calculate_file_hash(file_path)
-                        self.save_to_database(details, file_path, file_hash, source_tag, self.image_counter)
-                        success_count += 1
-                        self.stats['downloaded'] += 1
-                        if self.progress_bar is not None:
-                            self.progress_bar.update(1)
-                        self.image_counter += 1
-                        
-                    # Small delay between pages
-                    time.sleep(0.3)  # Reduced delay for speed
-                    
-                except Exception as e:
-                    if self.progress_bar is not None:
-                        self.progress_bar.write(f"❌ Error downloading page {i+1}: {e}")
-                    continue
-                    
-            if success_count > 0:
-                success = True
-            else:
-                self.stats['failed'] += 1
+        except Exception as e:
+            if self.progress_bar is not None:
+                self.progress_bar.write(f"❌ Error downloading page {page_index + 1} of {artwork_id}: {e}")
+        finally:
+            if not handed_off:
+                self._release_image_slot(False)
+        return False
+        
+    def _collect_finished(self, futures, done):
+        """Remove finished artwork futures, report errors and advance the tag cursor"""
+        cursors = set()
+        for future in done:
+            artwork_id, page, cursor = futures.pop(future)
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None:
+                self.progress_bar.write(f"❌ Error processing artwork {artwork_id}: {error}")
+                self._bump('failed')
+                
+            if cursor is not None:
+                # Anything short of done (failed, raised, partly saved or turned away
+                # by max_images or an interrupt) keeps its page for the next run
+                completed = error is None and future.result() is True
+                cursor.finish(page, completed=completed)
+                cursors.add(cursor)
                 
-        return success
+        for cursor in cursors:
+            if cursor.advance():
+                self.save_tag_progress(cursor.tag, cursor.completed_through)
         
-    def bulk_download_by_tag(self, tag, max_images=None, delay=0.8):  # Reduced delay for speed
+    def bulk_download_by_tag(self, tag, max_images=None, resume=True):
         """Download all artworks for a given tag - GETS ALL PAGES"""
-        # Initialize progress bar ]
+        return self.bulk_download_by_tags([tag], max_images=max_images, resume=resume)
+        
+    def bulk_download_by_tags(self, tags, max_images=None, resume=True, link_mode=LINK_HARDLINK):
+        """Download several tags with one session, database and worker pool, fetching each artwork once"""
+        return self.bulk_download_sources([(SOURCE_TAG, tag) for tag in tags], max_images, resume, link_mode)
+        
+    def bulk_download_by_user(self, user_id, max_images=None, include_manga=True, link_mode=LINK_HARDLINK):
+        """Download an artist's whole portfolio into user_<id>"""
+        source = SOURCE_USER if include_manga else SOURCE_USER_ILLUSTS
+        return self.bulk_download_sources([(source, user_id)], max_images, link_mode=link_mode)
+        
+    def bulk_download_by_bookmarks(self, user_id, max_images=None, private=False, link_mode=LINK_HARDLINK):
+        """Download a user's bookmarked works into bookmarks_<id>, private ones only for the PHPSESSID's own account"""
+        source = SOURCE_PRIVATE_BOOKMARKS if private else SOURCE_BOOKMARKS
+        return self.bulk_download_sources([(source, user_id)], max_images, link_mode=link_mode)
+        
+    def bulk_download_sources(self, sources, max_images=None, resume=True, link_mode=LINK_HARDLINK):
+        """Download a mix of (kind, value) SOURCE_KINDS sources with one session, database and worker pool"""
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"link_mode must be one of {LINK_MODES}, got {link_mode!r}")
+        for kind, _ in sources:
+            if kind not in SOURCE_KINDS:
+                raise ValueError(f"source kind must be one of {SOURCE_KINDS}, got {kind!r}")
+        self.link_mode = link_mode
+        
+        # Initialize progress bar
         if max_images is not None:
             self.progress_bar = tqdm(total=max_images, desc="Downloading images", unit="img")
         else:
             # For unlimited downloads, use a counter-style progress bar
             self.progress_bar = tqdm(desc="Downloading images", unit="img", total=None)
         
+        self.stop_event.clear()
+        self.run_started = time.monotonic()
+        self._start_transcoder()
+        
+        # Periodic Prometheus export for long runs
+        metrics_thread = None
+        if self.metrics_textfile is not None:
+            self.metrics_stop.clear()
+            metrics_thread = threading.Thread(target=self._metrics_loop, name="pixiv-metrics", daemon=True)
+            metrics_thread.start()
+        
+        # Bounded queue of artworks handed to the workers, shared by every source
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pixiv")
+        
+        # Sources run in order and share dedupe, linking and the max_images cap
+        try:
+            for index, (kind, value) in enumerate(sources, 1):
+                if len(sources) > 1:
+                    self.progress_bar.write(f"{SOURCE_ICONS[kind]} {SOURCE_LABELS[kind]} "
+                                            f"{index}/{len(sources)}: '{value}'")
+                self._download_source(kind, value, max_images, resume, executor, futures)
+                
+                # Finish this source before the next so its rows are visible for dedupe
+                if self.transcoder is not None:
+                    self.transcoder.drain()
+                    
+                if self._reached_max(max_images):
+                    break
+                
+        except KeyboardInterrupt:
+            self.progress_bar.write("\nℹ️  Download interrupted by user")
+            self.stop_event.set()
+            for future in futures:
+                future.cancel()
+        finally:
+            executor.shutdown(wait=True)
+            if self.transcoder is not None:
+                if self.transcoder.depth > 0:
+                    self.progress_bar.write(f"⏳ Waiting for {self.transcoder.depth} images still being encoded...")
+                self.transcoder.drain()
+            self.flush_database()
+            if metrics_thread is not None:
+                self.metrics_stop.set()
+                metrics_thread.join()
+            self.export_metrics_textfile()
+        
+        self.progress_bar.close()
+        return self.print_final_stats()
+        
+    def _download_source(self, kind, value, max_images, resume, executor, futures):
+        """Run one source of bulk_download_sources"""
+        if kind == SOURCE_TAG:
+            self._download_tag(value, max_images, resume, executor, futures)
+        elif kind in (SOURCE_USER, SOURCE_USER_ILLUSTS):
+            self._download_user(value, kind == SOURCE_USER, max_images, executor, futures)
+        else:
+            self._download_bookmarks(value, kind == SOURCE_PRIVATE_BOOKMARKS, max_images, executor, futures)
+            
+    def _dispatch_artworks(self, artworks, source_tag, page, cursor, max_images, executor, futures):
+        """Hand one listing page of artworks to the shared worker pool, returns False when max_images cut it short"""
+        # Resolve the page in one query, works already downloaded are linked instead of fetched
+        known = self.get_download_status(artwork.get('id') for artwork in artworks)
+        if known:
+            self._bump('skipped', len(known))
+            self.progress_bar.write(f"⏭️  Page {page}: {len(known)} already downloaded")
+            self._link_known_artworks(known, source_tag)
+            
+        max_pending = self.workers * 2
+        for artwork in artworks:
+            if str(artwork.get('id')) in known:
+                continue
+                
+            # Wait for a free spot in the queue before handing out more work
+            while len(futures) >= max_pending:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                self._collect_finished(futures, done)
+                
+            if self._reached_max(max_images):
+                return False
+                
+            future = executor.submit(self.download_artwork, artwork, source_tag, max_images, True)
+            futures[future] = (artwork.get('id', 'unknown'), page, cursor)
+            if cursor is not None:
+                cursor.add(page)
+        return True
+        
+    def _drain_futures(self, futures):
+        """Let the workers finish whatever is still queued"""
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            self._collect_finished(futures, done)
+            
+    def _download_user(self, user_id, include_manga, max_images, executor, futures):
+        """List a user's whole portfolio in a few calls and feed it to the shared pool"""
+        source_tag = f"user_{user_id}"
+        artwork_ids = self.get_user_artwork_ids(user_id, include_manga)
+        if artwork_ids is None:
+            self.progress_bar.write(f"❌ Could not list the works of user {user_id}")
+            return
+        self._bump('total_found', len(artwork_ids))
+        self.progress_bar.write(f"📊 User {user_id}: {len(artwork_ids)} works")
+        
+        # Only fetch metadata for works we do not have yet
+        known = self.get_download_status(artwork_ids)
+        if known:
+            self._bump('skipped', len(known))
+            self.progress_bar.write(f"⏭️  User {user_id}: {len(known)} already downloaded")
+            self._link_known_artworks(known, source_tag)
+        wanted = [artwork_id for artwork_id in artwork_ids if artwork_id not in known]
+        
+        for batch, start in enumerate(range(0, len(wanted), USER_WORKS_BATCH), 1):
+            if self._reached_max(max_images) or self.stop_event.is_set():
+                break
+            artworks = self.get_user_artworks(user_id, wanted[start:start + USER_WORKS_BATCH])
+            if artworks is None:
+                self._bump('failed', len(wanted[start:start + USER_WORKS_BATCH]))
+                continue
+            if not self._dispatch_artworks(artworks, source_tag, batch, None, max_images, executor, futures):
+                break
+                
+        self._drain_futures(futures)
+        
+    def _download_bookmarks(self, user_id, private, max_images, executor, futures):
+        """Walk a user's bookmarks BOOKMARKS_PAGE_SIZE at a time and feed them to the shared pool"""
+        source_tag = f"bookmarks_{user_id}"
+        offset = 0
         page = 1
+        while not self._reached_max(max_images) and not self.stop_event.is_set():
+            body = self.get_bookmarks_page(user_id, offset, private)
+            if body is None:
+                self.progress_bar.write(f"❌ Could not list bookmarks of user {user_id} at offset {offset}")
+                break
+            works = body.get('works') or []
+            if not works:
+                break
+            # Deleted or hidden works stay in the list without an image
+            artworks = [work for work in works if not work.get('isMasked')]
+            self._bump('total_found', len(artworks))
+            self.progress_bar.write(f"📊 Bookmarks page {page}: {len(artworks)} works "
+                                    f"({offset + len(works)}/{body.get('total', '?')})")
+            if not self._dispatch_artworks(artworks, source_tag, page, None, max_images, executor, futures):
+                break
+            offset += len(works)
+            page += 1
+            if offset >= body.get('total', 0):
+                break
+                
+        self._drain_futures(futures)
+        
+    def _download_tag(self, tag, max_images, resume, executor, futures):
+        """Walk the search pages of one tag, feeding artworks to the shared pool"""
+        page = self.get_resume_page(tag) if resume else 1
+        if page > 1:
+            self.progress_bar.write(f"⏩ Resuming '{tag}' from search page {page}")
+        cursor = TagCursor(tag, page)
+        reached_last_page = False
         consecutive_failures = 0
         max_consecutive_failures = 3
         
         while True:
             # Check if we've reached max images
-            if max_images and self.stats['downloaded'] >= max_images:
+            if self._reached_max(max_images):
                 self.progress_bar.write(f"🎯 Reached target of {max_images} images!")
                 break
                 
@@ -544,6 +2524,8 @@ class SimplifiedPixivDownloader:
                 self.progress_bar.write(f"❌ Too many consecutive failures ({consecutive_failures}). Stopping.")
                 break
                 
+            # Search pages are fetched on this thread while the workers download
+            # artworks from pages already found, so searching and transfers overlap
             search_results = self.search_artworks(tag, page)
             if not search_results:
                 consecutive_failures += 1
@@ -564,55 +2546,43 @@ class SimplifiedPixivDownloader:
             # Check if we've reached the end
             if not artworks:
                 self.progress_bar.write("✅ No more artworks found - reached end of results")
+                cursor.listed_page(page)
+                reached_last_page = True
                 break
                 
             # Check if this is the last page according to API
             is_last_page = illust_manga.get('isLastPage', False)
             total_available = illust_manga.get('total', 0)
             
-            self.stats['total_found'] += total_on_page
+            self._bump('total_found', total_on_page)
             self.progress_bar.write(f"📊 Page {page}: Found {total_on_page} artworks")
             
-            page_success = 0
-            for i, artwork in enumerate(artworks, 1):
-                try:
-                    if self.download_artwork(artwork, tag, max_images):
-                        page_success += 1
-                    else:
-                        # If download_artwork returns False due to max_images, break
-                        if max_images and self.stats['downloaded'] >= max_images:
-                            break
-                        
-                    # Rate limiting - faster but still respectful
-                    time.sleep(delay)
-                    
-                except KeyboardInterrupt:
-                    self.progress_bar.write("\nℹ️  Download interrupted by user")
-                    self.progress_bar.close()
-                    return self.print_final_stats()
-                except Exception as e:
-                    self.progress_bar.write(f"❌ Error processing artwork {artwork.get('id', 'unknown')}: {e}")
-                    self.stats['failed'] += 1
-                    continue
+            # Resolve the whole page against the database before any network call
+            if self._dispatch_artworks(artworks, tag, page, cursor, max_images, executor, futures):
+                # Every artwork of this page is either known or with the workers
+                cursor.listed_page(page)
+
             
             # Check if we've reached max images
-            if max_images and self.stats['downloaded'] >= max_images:
+            if self._reached_max(max_images):
                 self.progress_bar.write(f"🎯 Reached target of {max_images} images!")
                 break
                 
             # Check if there are more pages
             if is_last_page:
                 self.progress_bar.write("✅ Reached last page according to API")
+                reached_last_page = True
                 break
                 
-            # Continue to next page
+            # Continue to next page while the workers finish this one
             page += 1
             
-            # Shorter delay between pages for speed
-            time.sleep(1.5)
-        
-        self.progress_bar.close()
-        return self.print_final_stats()
+        self._drain_futures(futures)
+            
+        # Remember that the whole tag was walked so the next run starts fresh
+        cursor.advance()
+        if reached_last_page and cursor.completed_through >= page:
+            self.save_tag_progress(tag, cursor.completed_through, page)
         
     def print_final_stats(self):
         """Print final download statistics"""
@@ -622,30 +2592,72 @@ class SimplifiedPixivDownloader:
         print(f"📊 Final Statistics:")
         print(f"   📥 Total Downloaded: {self.stats['downloaded']}")
         print(f"   ⚡ Total Converted to PNG: {self.stats['converted']}")
+        print(f"   📦 Total Kept Original: {self.stats['kept_original']}")
         print(f"   ⭐️  Total Skipped: {self.stats['skipped']}")
+        print(f"   📄 Pages Already On Disk: {self.stats['pages_skipped']}")
+        print(f"   🔗 Linked From Other Tags: {self.stats['linked']}")
+        print(f"   ♻️  Duplicates Reused: {self.stats['duplicates']}")
         print(f"   ❌ Total Failed: {self.stats['failed']}")
+        print(f"   📏 Skipped As Oversized: {self.stats['oversized']}")
+        print(f"   ↪️  Resumed Transfers: {self.stats['resumed_transfers']}")
+        filtered = {reason: self.stats[f'filtered_{reason}'] for reason in FILTER_REASONS
+                    if self.stats[f'filtered_{reason}']}
+        if filtered:
+            reasons = ', '.join(f"{reason} {count}" for reason, count in filtered.items())
+            print(f"   🧹 Filtered Before Download: {sum(filtered.values())} ({reasons})")
         print(f"   🔍 Total Found: {self.stats['total_found']}")
+        print(f"   🚀 Details Calls Saved: {self.stats['details_skipped']} "
+              f"(derived URL missed {self.stats['derived_url_misses']}x)")
         print(f"   📁 Download Directory: {self.download_dir.absolute()}")
         print("=" * 60)
         
         success_rate = (self.stats['downloaded'] / max(self.stats['total_found'], 1)) * 100
         print(f"✨ Success Rate: {success_rate:.1f}%")
         
+        # Pacing and retries
+        rates = ', '.join(f"{host} {rate:.1f}/s" for host, rate in self.rate_limiter.current_rates().items())
+        print(f"🚦 Final request rates: {rates or 'n/a'}")
+        print(f"🔁 Retries: {self.retry_budget.spent} used, {self.retry_budget.denied} denied by budget")
+        
+        # Per-stage throughput
+        elapsed = max(time.monotonic() - self.run_started, 1e-9)
+        megabytes = self.stats['bytes_downloaded'] / (1024 * 1024)
+        print(f"🌐 Network: {megabytes:.1f} MB at {megabytes / elapsed:.2f} MB/s")
+        if self.transcoder is not None:
+            encode = self.transcoder.stats()
+            print(f"🖼️  Encode: {encode['encoded']} images at {encode['images_per_sec']:.2f} img/s "
+                  f"on {self.transcoder.encoders} processes "
+                  f"(peak queue {encode['peak_queue_depth']}/{self.transcoder.max_queue}, "
+                  f"network blocked {encode['blocked_seconds']:.1f}s)")
+                  
+        # Where the time went, slowest stages first
+        stages = self.metrics.summary()
+        if stages:
+            print("⏱️  Stage timings (total / mean / p90 / max):")
+            for name, stage in sorted(stages.items(), key=lambda item: -item[1]['total_seconds']):
+                print(f"   {name:<18} {stage['count']:>6}x  {stage['total_seconds']:8.1f}s  "
+                      f"{stage['mean_seconds'] * 1000:8.1f}ms  {stage['p90_seconds'] * 1000:8.1f}ms  "
+                      f"{stage['max_seconds'] * 1000:8.1f}ms")
+        summary_path = self.write_metrics_summary()
+        if summary_path is not None:
+            print(f"📈 Metrics summary: {summary_path}")
+        
         return self.stats
 
 def get_user_input():
-    """Get user input for tag and image count"""
+    """Get user input for tags, image count, worker count and storage mode"""
     clear_screen()
     print("\n🎨 Simplified Pixiv Downloader")
     print("🔞 Always downloads ALL content (NSFW content will appear if your Pixiv account settings have NSFW enabled.)")
-    print("📁 Structure: PixivImages/TopicName/1_ArtistName.png, 2_ArtistName.png")
+    print("📁 Structure: PixivImages/TopicName/ArtworkID_p0_ArtistName.png, ArtworkID_p1_ArtistName.png")
     print("⚡ Fast PNG conversion mode enabled")
     print("=" * 60)
     
-    # Get tag name
+    # Get tag names (several comma-separated tags run as one batch)
     while True:
-        tag = input("🏷️  Enter tag name: ").strip()
-        if tag:
+        tags = [tag.strip() for tag in input("🏷️  Enter tag name(s), comma-separated: ").split(',')]
+        tags = [tag for tag in tags if tag]
+        if tags:
             break
         print("❌ Please enter a valid tag name")
     
@@ -661,7 +2673,201 @@ def get_user_input():
         else:
             print("❌ Please enter a valid number or press Enter for all")
     
-    return tag, max_images
+    # Get number of parallel workers
+    while True:
+        count = input("⚡ Number of parallel workers (press Enter for 4): ").strip()
+        if not count:
+            workers = 4
+            break
+        elif count.isdigit() and int(count) > 0:
+            workers = int(count)
+            break
+        else:
+            print("❌ Please enter a valid number or press Enter for 4")
+    
+    # Get storage mode
+    while True:
+        keep = input("📦 Keep original files instead of converting to PNG? (y/N): ").strip().lower()
+        if keep in ['', 'n', 'no']:
+            storage_mode = STORAGE_PNG
+            break
+        elif keep in ['y', 'yes']:
+            storage_mode = STORAGE_ORIGINAL
+            break
+        else:
+            print("❌ Please enter 'y' or 'n'")
+    
+    return tags, max_images, workers, storage_mode
+
+def run_cli():
+    """Command-line batch mode: several tags, artists and bookmark lists in one run without prompts"""
+    parser = argparse.ArgumentParser(description="Simplified Pixiv Downloader (batch mode)")
+    parser.add_argument('tags', nargs='*', help='Tags to download, in order')
+    parser.add_argument('--tags-file', help='Text file with one tag per line')
+    parser.add_argument('--user', action='append', default=[], help="Download this user ID's whole portfolio (repeatable)")
+    parser.add_argument('--no-manga', action='store_true', help='With --user, skip manga and only take illustrations')
+    parser.add_argument('--bookmarks', action='append', default=[], help="Download this user ID's bookmarks (repeatable)")
+    parser.add_argument('--private-bookmarks', action='store_true',
+                        help="With --bookmarks, list the hidden bookmarks (your own account only)")
+    parser.add_argument('--phpsessid', default=os.environ.get('PIXIV_PHPSESSID'),
+                        help='Pixiv PHPSESSID cookie (default: $PIXIV_PHPSESSID)')
+    parser.add_argument('--max-images', type=int, help='Stop after this many images in total')
+    parser.add_argument('--workers', type=int, default=4, help='Number of parallel workers (default: 4)')
+    parser.add_argument('--page-concurrency', type=int, default=PAGE_CONCURRENCY,
+                        help='Pages of one multi-page work fetched at once (default: 4)')
+    parser.add_argument('--encoders', type=int, help='PNG encoder processes (default: all cores, 0 = inline)')
+    parser.add_argument('--keep-original', action='store_true', help='Keep original files instead of converting to PNG')
+    parser.add_argument('--max-image-mb', type=float, help='Skip images larger than this many MB')
+    parser.add_argument('--spool-mb', type=float, default=SPOOL_MEMORY_LIMIT / (1024 * 1024),
+                        help='Keep downloads up to this many MB in memory, larger ones go to a temp file (default: 8)')
+    parser.add_argument('--min-width', type=int, help='Skip works narrower than this many pixels')
+    parser.add_argument('--min-height', type=int, help='Skip works shorter than this many pixels')
+    parser.add_argument('--min-aspect', type=float, help='Skip works with width/height below this')
+    parser.add_argument('--max-aspect', type=float, help='Skip works with width/height above this')
+    parser.add_argument('--ai', choices=FILTER_MODES, default=FILTER_ANY,
+                        help='Keep, exclude or only download AI-generated works (default: any)')
+    parser.add_argument('--r18', choices=FILTER_MODES, default=FILTER_ANY,
+                        help='Keep, exclude or only download R-18 works (default: any)')
+    parser.add_argument('--min-bookmarks', type=int, help='Skip works with fewer bookmarks (needs a details call)')
+    parser.add_argument('--max-pages', type=int, help='Skip works with more pages than this')
+    parser.add_argument('--metrics-json', help='Where to write the JSON run summary (default: next to the database)')
+    parser.add_argument('--metrics-textfile', help='Prometheus textfile rewritten during the run')
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL,
+                        help='Seconds between textfile rewrites (default: 15)')
+    parser.add_argument('--link-mode', choices=LINK_MODES, default=LINK_HARDLINK,
+                        help='How artworks shared between tags appear in later tag folders')
+    parser.add_argument('--no-resume', action='store_true', help='Start every tag from search page 1')
+    parser.add_argument('--download-dir', default='PixivImages', help='Output directory (default: PixivImages)')
+    parser.add_argument('--db-path', default='pixiv_downloads.db', help='Database file (default: pixiv_downloads.db)')
+    args = parser.parse_args()
+    
+    tags = list(args.tags)
+    if args.tags_file:
+        with open(args.tags_file, 'r', encoding='utf-8') as f:
+            tags.extend(line.strip() for line in f if line.strip())
+    sources = [(SOURCE_TAG, tag) for tag in tags]
+    sources += [(SOURCE_USER_ILLUSTS if args.no_manga else SOURCE_USER, user_id) for user_id in args.user]
+    sources += [(SOURCE_PRIVATE_BOOKMARKS if args.private_bookmarks else SOURCE_BOOKMARKS, user_id)
+                for user_id in args.bookmarks]
+    for _, user_id in sources[len(tags):]:
+        if not user_id.isdigit():
+            parser.error(f"user IDs are numeric, got {user_id!r}")
+    if not sources:
+        parser.error("no tags, --user or --bookmarks given")
+    if not args.phpsessid:
+        parser.error("--phpsessid or PIXIV_PHPSESSID is required")
+        
+    downloader = SimplifiedPixivDownloader(
+        phpsessid=args.phpsessid,
+        download_dir=args.download_dir,
+        db_path=args.db_path,
+        workers=args.workers,
+        storage_mode=STORAGE_ORIGINAL if args.keep_original else STORAGE_PNG,
+        encoders=args.encoders,
+        spool_memory_limit=int(args.spool_mb * 1024 * 1024),
+        max_image_bytes=int(args.max_image_mb * 1024 * 1024) if args.max_image_mb else None,
+        metrics_json=args.metrics_json,
+        metrics_textfile=args.metrics_textfile,
+        metrics_interval=args.metrics_interval,
+        page_concurrency=args.page_concurrency,
+        artwork_filter=ArtworkFilter(
+            min_width=args.min_width,
+            min_height=args.min_height,
+            min_aspect=args.min_aspect,
+            max_aspect=args.max_aspect,
+            ai_mode=args.ai,
+            r18_mode=args.r18,
+            min_bookmarks=args.min_bookmarks,
+            max_pages=args.max_pages
+        )
+    )
+    try:
+        downloader.bulk_download_sources(
+            sources=sources,
+            max_images=args.max_images,
+            resume=not args.no_resume,
+            link_mode=args.link_mode
+        )
+    finally:
+        downloader.close()
+
+def run_query_cli(argv=None):
+    """Select downloaded images by tag or text and print or export their file paths"""
+    parser = argparse.ArgumentParser(prog="PixivScraper.py query",
+                                     description="Select downloaded Pixiv images through the tag index")
+    parser.add_argument('--tag', action='append', default=[], help='Require this tag (repeatable)')
+    parser.add_argument('--not-tag', action='append', default=[], help='Exclude artworks with this tag (repeatable)')
+    parser.add_argument('--match', help='FTS5 query over titles and tags, e.g. "sunset OR beach"')
+    parser.add_argument('--source-tag', help='Only images downloaded while searching this tag')
+    parser.add_argument('--limit', type=int, help='Return at most this many images')
+    parser.add_argument('--order', choices=('artwork', 'number'), default='artwork',
+                        help='Sort by artwork and page, or by sequential image number (default: artwork)')
+    parser.add_argument('--format', choices=('paths', 'csv', 'json'), default='paths', help='Output format (default: paths)')
+    parser.add_argument('--output', help='Write to this file instead of stdout')
+    parser.add_argument('--db-path', default='pixiv_downloads.db', help='Database file (default: pixiv_downloads.db)')
+    args = parser.parse_args(argv)
+    
+    if not Path(args.db_path).exists():
+        parser.error(f"database {args.db_path} does not exist")
+    db = sqlite3.connect(args.db_path)
+    try:
+        db.execute(CREATE_DOWNLOADS_SQL)
+        # Databases written before per-page rows have no page_index to query on
+        migrate_to_page_rows(db.cursor())
+        fts_enabled = ensure_tag_index(db.cursor())
+        db.commit()
+        if args.match and not fts_enabled:
+            parser.error("--match needs an SQLite build with FTS5")
+            
+        start = time.perf_counter()
+        try:
+            rows = query_downloads(db, args.tag, args.not_tag, args.match, args.source_tag, args.limit,
+                                   order_by_number=args.order == 'number')
+        except sqlite3.OperationalError as e:
+            parser.error(f"invalid query: {e}")
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+        
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'paths':
+            for row in rows:
+                out.write(f"{row[2]}\n")
+        elif args.format == 'csv':
+            import csv
+            writer = csv.writer(out)
+            writer.writerow(QUERY_COLUMNS)
+            writer.writerows(rows)
+        else:
+            json.dump([dict(zip(QUERY_COLUMNS, row)) for row in rows],
+                      out, ensure_ascii=False, indent=2)
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+            
+    # Summary on stderr so stdout stays a clean file list
+    print(f"🔎 {len(rows)} images selected in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return rows
+
+def run_reconcile_cli(argv=None):
+    """Sync the download database with the files actually on disk"""
+    parser = argparse.ArgumentParser(prog="PixivScraper.py reconcile",
+                                     description="Fix moved files and purge missing ones from the Pixiv database")
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    parser.add_argument('--download-dir', default='PixivImages', help='Output directory (default: PixivImages)')
+    parser.add_argument('--db-path', default='pixiv_downloads.db', help='Database file (default: pixiv_downloads.db)')
+    args = parser.parse_args(argv)
+    
+    if not Path(args.db_path).exists():
+        parser.error(f"database {args.db_path} does not exist")
+    # No requests are made, so no PHPSESSID is needed
+    downloader = SimplifiedPixivDownloader(phpsessid='', download_dir=args.download_dir, db_path=args.db_path)
+    try:
+        return downloader.reconcile(dry_run=args.dry_run)
+    finally:
+        downloader.close()
 
 def main():
     """Main function with TOS and interactive input"""
@@ -680,28 +2886,34 @@ def main():
         sys.exit(1)
     
     # Get user preferences
-    tag, max_images = get_user_input()
+    tags, max_images, workers, storage_mode = get_user_input()
     clear_screen()
     print(f"\n🚀 Starting download with settings:")
-    print(f"   🏷️  Tag: {tag}")
+    print(f"   🏷️  Tags: {', '.join(tags)}")
     print(f"   📊 Images: {max_images or 'ALL AVAILABLE'}")
+    print(f"   ⚡ Workers: {workers}")
     print(f"   🔞 Content: ALL (NSFW content will appear if your Pixiv account settings have NSFW enabled.)")
-    print(f"   🎨 Format: All converted to PNG (FAST MODE)")
-    print(f"   📂 Structure: PixivImages/{tag}/1_ArtistName.png, 2_ArtistName.png...")
+    if storage_mode == STORAGE_ORIGINAL:
+        print(f"   🎨 Format: Original files, no re-encoding")
+        print(f"   📂 Structure: PixivImages/{tags[0]}/ArtworkID_p0_ArtistName.jpg, ArtworkID_p1_ArtistName.png...")
+    else:
+        print(f"   🎨 Format: All converted to PNG (FAST MODE)")
+        print(f"   📂 Structure: PixivImages/{tags[0]}/ArtworkID_p0_ArtistName.png, ArtworkID_p1_ArtistName.png...")
     
     # Initialize downloader
     downloader = SimplifiedPixivDownloader(
         phpsessid=phpsessid,
         download_dir="PixivImages",
-        db_path="pixiv_downloads.db"
+        db_path="pixiv_downloads.db",
+        workers=workers,
+        storage_mode=storage_mode
     )
     
     # Start bulk download
     try:
-        downloader.bulk_download_by_tag(
-            tag=tag,
-            max_images=max_images,
-            delay=0.8  # Faster delay
+        downloader.bulk_download_by_tags(
+            tags=tags,
+            max_images=max_images
         )
     except KeyboardInterrupt:
         print("\nℹ️  Download interrupted by user")
@@ -709,6 +2921,15 @@ def main():
         print(f"❌ Unexpected error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        downloader.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == 'query':
+        run_query_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'reconcile':
+        run_reconcile_cli(sys.argv[2:])
+    elif len(sys.argv) > 1:
+        run_cli()
+    else:
+        main()
\ No newline at end of file
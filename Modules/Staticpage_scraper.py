@@ -3,7 +3,7 @@ import io
 import os
 import requests
 import urllib.parse
-from bs4 import BeautifulSoup
+from html_parsing import make_soup
 import selenium
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -129,7 +129,8 @@ class CloudflareWebScraper:
         :return: Extracted content dictionary
         """
         try:
-            soup = BeautifulSoup(page_source, 'html.parser')
+            # Full tree: the text, link, image and Cloudflare checks span most tags
+            soup = make_soup(page_source)
 
             cloudflare_indicators = [
                 soup.find(string=re.compile(r'Cloudflare|Security Check|Checking your browser')),
@@ -0,0 +1,24 @@
+"""Shared HTML parsing helpers for the scrapers
+
+Picks the fastest BeautifulSoup backend that is installed (lxml, falling
+back to the built-in html.parser) and lets callers restrict the tree to
+the tags they actually query, so large pages don't build a full DOM.
+"""
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+# Tags the image scrapers look at: links to artwork pages and the images themselves
+LINK_TAGS = ('a',)
+LINK_AND_IMAGE_TAGS = ('a', 'img')
+
+
+def make_soup(markup, tags=None, parser=None):
+    """Parse markup with the default backend, keeping only `tags` (and their contents) when given"""
+    # Other ancestors are dropped, so select/find_all calls must not rely on them
+    parse_only = SoupStrainer(list(tags)) if tags else None
+    return BeautifulSoup(markup, parser or DEFAULT_PARSER, parse_only=parse_only)